@@ -0,0 +1,212 @@
+import glob
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from holiday_mailer import (
+    configure_holiday_data,
+    create_content_generator,
+    create_email_sender,
+    fetch_email_schedule,
+    load_config,
+    pregenerate_upcoming,
+    resolve_fallback_settings,
+    resolve_openai_settings,
+    send_holiday_email,
+    write_run_report,
+)
+from schedule_store import ScheduleStore
+
+
+def expand_config_paths(paths):
+    """展开配置路径，目录会替换为其中的所有JSON文件。
+
+    参数:
+        paths (list): 配置文件或目录路径列表
+
+    返回:
+        list: 配置文件路径列表
+    """
+    config_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            config_paths.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            config_paths.append(path)
+    return config_paths
+
+
+def tenant_names(config_paths):
+    """为每个配置文件确定租户名称，即相对于所有配置共同目录的路径（不含扩展名）。
+
+    不同目录中的同名配置（如 deptA/config.json 和 deptB/config.json）是不同的租户。
+
+    参数:
+        config_paths (list): 配置文件路径列表
+
+    返回:
+        dict: 租户名称到配置文件路径的映射
+
+    异常:
+        ValueError: 同一个配置文件出现多次
+    """
+    if not config_paths:
+        return {}
+    base = os.path.commonpath(
+        [os.path.dirname(os.path.abspath(path)) for path in config_paths]
+    )
+    names = {}
+    for path in config_paths:
+        relative = os.path.relpath(os.path.abspath(path), base)
+        name = os.path.splitext(relative)[0].replace(os.sep, "/")
+        if name in names:
+            raise ValueError(f"配置文件重复：{names[name]} 和 {path}")
+        names[name] = path
+    return names
+
+
+def generator_key(config, settings):
+    """返回决定内容生成器行为的设置，设置相同的租户可以共用一个内容生成器。
+
+    参数:
+        config (dict): 租户的配置数据
+        settings (dict): resolve_openai_settings 返回的OpenAI设置
+
+    返回:
+        str: 设置的JSON表示
+    """
+    return json.dumps(
+        {
+            "endpoint": [
+                settings["base_url"],
+                settings["api_key"],
+                settings["email_model"],
+            ],
+            "fallback": resolve_fallback_settings(config, settings),
+            "stream": config["openai"].get("stream", False),
+            "cache": [
+                config["openai"].get("content_cache_path", "content_cache.db"),
+                config["openai"].get("content_cache_max_entries", 64),
+                config["openai"].get("content_cache_ttl_days", 30),
+            ],
+            "resilience": config.get("resilience", {}),
+        },
+        sort_keys=True,
+    )
+
+
+def run_batch(paths, logger, test=False, max_tenants=4, max_connections=16):
+    """批量运行多个配置（租户），节假日数据只获取一次，相同节日和模型的邮件只生成一次。
+
+    节假日缓存、年度索引和日程表使用第一个配置中的设置，apart_day取所有配置中的最大值。
+    内容生成器按各租户自己的大模型、备用模型、流式、内容缓存和容错设置创建，设置完全相同的租户共用。
+
+    参数:
+        paths (list): 配置文件或目录路径列表
+        logger (logging.Logger): 日志记录器
+        test (bool): 测试模式，不实际发送邮件
+        max_tenants (int): 同时发送邮件的租户数，不超过 max_connections
+        max_connections (int): 所有租户合计的最大SMTP连接数
+    """
+    tenants = {}
+    for name, path in tenant_names(expand_config_paths(paths)).items():
+        tenants[name] = load_config(path)
+    if not tenants:
+        logger.error("没有找到配置文件")
+        return
+    logger.info(f"已加载 {len(tenants)} 个配置：{', '.join(tenants)}")
+
+    shared_config = dict(next(iter(tenants.values())))
+    shared_config["holiday"] = dict(
+        shared_config["holiday"],
+        apart_day=max(
+            config["holiday"].get("apart_day", 7) for config in tenants.values()
+        ),
+    )
+    configure_holiday_data(shared_config)
+
+    # 内容生成设置完全相同的租户共用一个内容生成器，邮件内容只生成一次
+    settings = {}
+    generators = {}
+    tenant_generators = {}
+    for name, config in tenants.items():
+        settings[name] = resolve_openai_settings(config)
+        if not all(settings[name].values()):
+            raise ValueError(f"{name} 缺少必要的 OpenAI 设置，请检查配置文件或环境变量。")
+        key = generator_key(config, settings[name])
+        if key not in generators:
+            generators[key] = create_content_generator(config, settings[name])
+        tenant_generators[name] = generators[key]
+
+    # 节假日日程只获取一次
+    weekday = datetime.now().weekday()
+    schedule = ScheduleStore()
+    fetch_today = not schedule or any(
+        config["holiday"].get("date_fetch_weekday", 6) == weekday
+        for config in tenants.values()
+    )
+    if fetch_today:
+        first = next(iter(tenants))
+        schedule = fetch_email_schedule(shared_config, settings[first], logger)
+        for generator in generators.values():
+            pregenerate_upcoming(generator, schedule, logger)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    due = [entry["holiday_name"] for entry in schedule.due_on(today)]
+    if not due:
+        logger.info("今天不是特殊日期，不发送邮件。")
+        return
+
+    # 发送前为每个模型生成一次今天的邮件内容，之后各租户直接读取缓存
+    for generator in generators.values():
+        generator.pregenerate(due)
+
+    # 所有租户同时使用的SMTP连接数不超过全局上限，每个租户至少需要一个连接
+    max_tenants = max(1, min(max_tenants, len(tenants), max_connections))
+    per_tenant_connections = max(1, max_connections // max_tenants)
+
+    def send(name):
+        config = tenants[name]
+        tenant_logger = logging.getLogger(f"{logger.name}.{name}")
+        try:
+            email_sender = None
+            if not test:
+                email_sender = create_email_sender(config)
+                email_sender.max_connections = min(
+                    email_sender.max_connections, per_tenant_connections
+                )
+        except Exception as e:
+            tenant_logger.exception(f"发生错误：{str(e)}")
+            return name, False
+        # 一个节日发送失败不影响同一租户其他节日的发送
+        success = True
+        for holiday_name in due:
+            try:
+                if not send_holiday_email(
+                    config,
+                    tenant_generators[name],
+                    holiday_name,
+                    tenant_logger,
+                    test=test,
+                    email_sender=email_sender,
+                    tenant=name,
+                ):
+                    success = False
+            except Exception as e:
+                tenant_logger.exception(f"发送{holiday_name}的邮件时发生错误：{str(e)}")
+                success = False
+        return name, success
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_tenants) as executor:
+            results = dict(executor.map(send, tenants))
+    finally:
+        write_run_report(shared_config, logger)
+
+    failed = [name for name, success in results.items() if not success]
+    if failed:
+        logger.error(f"以下配置的邮件发送失败：{', '.join(failed)}")
+    else:
+        logger.info(f"{len(results)} 个配置的邮件全部发送完成")
@@ -0,0 +1,285 @@
+"""离线基准测试使用的本地服务：SMTP接收端、节假日API和兼容OpenAI的大模型接口。
+
+所有服务都监听 127.0.0.1 的随机端口，在后台线程中运行，只用于基准测试和本地调试。
+"""
+
+import json
+import socketserver
+import threading
+import time
+from datetime import date as date_cls
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 固定日期的节日，节假日API对这些日期返回节日
+HOLIDAYS = {
+    "01-01": "元旦",
+    "02-17": "春节",
+    "04-05": "清明节",
+    "05-01": "劳动节",
+    "06-19": "端午节",
+    "09-25": "中秋节",
+    "10-01": "国庆节",
+}
+
+SAMPLE_EMAIL = (
+    "标题：节日祝福 | Holiday Greetings\n\n"
+    "亲爱的同事们，\n"
+    "节日是家人团聚、辞旧迎新的时刻，愿大家**身体健康**，万事如意。\n"
+    "- 感谢大家一年的支持\n"
+    "- 祝大家节日快乐\n"
+    "------\n"
+    "Dear team,\n"
+    "Wishing you and your families joy and prosperity this holiday season.\n"
+)
+
+
+class _BackgroundServer:
+    """在后台线程中运行的服务，支持 with 语句。"""
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+
+    def handle(self):
+        self._reply("220 localhost SMTP sink ready")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.decode("ascii", "replace").strip().split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(
+                    b"250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250-8BITMIME\r\n250 SIZE 0\r\n"
+                )
+            elif verb == "HELO":
+                self._reply("250 localhost")
+            elif verb == "AUTH":
+                self._reply("235 2.7.0 Authentication successful")
+            elif verb == "MAIL":
+                recipients = 0
+                self._reply("250 2.1.0 OK")
+            elif verb == "RCPT":
+                recipients += 1
+                self._reply("250 2.1.5 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line == b".\r\n":
+                        break
+                    size += len(data_line)
+                if self.server.latency:
+                    time.sleep(self.server.latency)
+                self.server.record(recipients, size)
+                self._reply("250 2.0.0 OK")
+            elif verb in ("RSET", "NOOP"):
+                self._reply("250 2.0.0 OK")
+            elif verb == "QUIT":
+                self._reply("221 2.0.0 Bye")
+                return
+            else:
+                self._reply("502 5.5.2 Command not recognized")
+
+
+class SMTPSink(_BackgroundServer, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0):
+        """初始化只接收不投递的SMTP服务，接受任意账号登录，不支持STARTTLS。
+
+        参数:
+            latency (float): 每封邮件接收完成后回复前等待的秒数
+        """
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.messages = 0
+        self.recipients = 0
+        self.bytes = 0
+
+    def record(self, recipients, size):
+        with self._lock:
+            self.messages += 1
+            self.recipients += recipients
+            self.bytes += size
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _HolidayHandler(_JSONHandler):
+    def do_GET(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.server.record()
+        date = parse_qs(urlparse(self.path).query).get("date", [""])[0]
+        try:
+            day = date_cls.fromisoformat(date)
+        except ValueError:
+            self.send_error(400, "invalid date")
+            return
+        name = HOLIDAYS.get(date[5:])
+        if name:
+            data = {"date": date, "isHoliday": True, "note": name}
+        elif day.weekday() >= 5:
+            data = {"date": date, "isHoliday": True, "note": "周末"}
+        else:
+            data = {"date": date, "isHoliday": False, "note": "工作日"}
+        self._send_json(data)
+
+
+class FakeHolidayAPI(_BackgroundServer, ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        """初始化与节假日API格式相同的本地服务，周末和 HOLIDAYS 中的日期为节假日。
+
+        参数:
+            latency (float): 每个请求回复前等待的秒数
+        """
+        super().__init__(("127.0.0.1", 0), _HolidayHandler)
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def record(self):
+        with self._lock:
+            self.requests += 1
+
+
+class _ChatHandler(_JSONHandler):
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("chat/completions"):
+            self.send_error(404)
+            return
+        self.server.record()
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        prompt_tokens = sum(
+            len(str(message.get("content", ""))) for message in request.get("messages", [])
+        )
+        content = self.server.content
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content),
+            "total_tokens": prompt_tokens + len(content),
+        }
+        base = {
+            "id": "chatcmpl-bench",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+        }
+        if not request.get("stream"):
+            self._send_json(
+                dict(
+                    base,
+                    object="chat.completion",
+                    choices=[
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    usage=usage,
+                )
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        size = self.server.chunk_size
+        chunks = [content[i : i + size] for i in range(0, len(content), size)]
+        for index, chunk in enumerate(chunks + [None]):
+            if index and self.server.chunk_delay:
+                time.sleep(self.server.chunk_delay)
+            event = dict(
+                base,
+                object="chat.completion.chunk",
+                choices=[
+                    {
+                        "index": 0,
+                        "delta": {"content": chunk} if chunk is not None else {},
+                        "finish_reason": None if chunk is not None else "stop",
+                    }
+                ],
+            )
+            if chunk is None:
+                event["usage"] = usage
+            self.wfile.write(
+                b"data: " + json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n\n"
+            )
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class MockOpenAIServer(_BackgroundServer, ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, chunk_delay=0.0, chunk_size=8, content=SAMPLE_EMAIL):
+        """初始化兼容OpenAI chat/completions 接口的本地服务，总是返回固定内容。
+
+        参数:
+            latency (float): 返回第一个字节前等待的秒数
+            chunk_delay (float): 流式返回时每个片段之间等待的秒数
+            chunk_size (int): 流式返回时每个片段的字符数
+            content (str): 返回的内容
+        """
+        super().__init__(("127.0.0.1", 0), _ChatHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.content = content
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def record(self):
+        with self._lock:
+            self.requests += 1
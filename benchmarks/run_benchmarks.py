@@ -0,0 +1,248 @@
+"""离线基准测试：使用本地的SMTP、节假日API和大模型服务测量各阶段的吞吐量和延迟。
+
+测量 date_fetch_main（冷启动和命中缓存）、generate_email_content（调用大模型、流式和
+命中缓存）以及 send_email 在不同收件人数量下的耗时。每次运行的结果追加到 JSONL 文件，
+并与文件中的上一次结果比较，便于在版本之间追踪性能变化。
+
+用法:
+    python benchmarks/run_benchmarks.py [--recipients 10 100 1000 10000 100000]
+        [--llm-latency 0.2] [--output benchmarks/results.jsonl]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from fake_servers import FakeHolidayAPI, MockOpenAIServer, SMTPSink  # noqa: E402
+
+from metrics import get_registry  # noqa: E402
+
+
+def git_commit():
+    """返回当前代码的提交号，不在git仓库中时返回None。"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def stage_stats(name):
+    """返回指标记录中某个阶段的统计，未记录时返回None。"""
+    return get_registry().report()["stages"].get(name)
+
+
+def timed(func):
+    """运行函数并返回 (耗时秒数, 返回值)。"""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def bench_date_fetch(holiday_api, apart_day):
+    import date_fetcher
+
+    date_fetcher.configure_holiday_cache("holiday_cache.db")
+    date_fetcher.configure_holiday_index("holiday_index")
+    weekday = datetime.now().weekday()
+
+    results = {}
+    for case in ("cold", "warm"):
+        requests_before = holiday_api.requests
+        get_registry().reset()
+        seconds, _ = timed(
+            lambda: date_fetcher.date_fetch_main(
+                base_url="",
+                api_key="",
+                model="",
+                apart_day=apart_day,
+                date_fetch_weekday=weekday,
+                mode="scan",
+            )
+        )
+        results[case] = {
+            "seconds": round(seconds, 4),
+            "http_requests": holiday_api.requests - requests_before,
+        }
+    return results
+
+
+def bench_generate(llm):
+    from content_cache import ContentCache
+    from content_generator import ContentGenerator
+
+    results = {}
+    for case, stream in (("cold", False), ("stream", True)):
+        generator = ContentGenerator(
+            api_key="bench",
+            base_url=llm.base_url,
+            model="mock",
+            cache=ContentCache(f"content_cache_{case}.db"),
+            stream=stream,
+        )
+        get_registry().reset()
+        seconds, _ = timed(lambda: generator.generate_email_content("国庆节"))
+        results[case] = {"seconds": round(seconds, 4)}
+        time_to_subject = stage_stats("llm_time_to_subject")
+        if time_to_subject:
+            results[case]["time_to_subject"] = time_to_subject["max_seconds"]
+        if case == "cold":
+            get_registry().reset()
+            seconds, _ = timed(lambda: generator.generate_email_content("国庆节"))
+            results["warm"] = {"seconds": round(seconds, 4)}
+    return results
+
+
+def bench_send(smtp, recipient_counts, max_connections):
+    from email_sender import EmailSender
+    from content_generator import ContentGenerator
+    from fake_servers import SAMPLE_EMAIL
+
+    content = ContentGenerator.parse_email_content(SAMPLE_EMAIL)
+    sender = EmailSender(
+        smtp_server="127.0.0.1",
+        smtp_port=smtp.port,
+        username="bench@example.com",
+        password="bench",
+        sender_name="基准测试",
+        ssl=False,
+        starttls=False,
+        max_connections=max_connections,
+    )
+    results = {}
+    for count in recipient_counts:
+        path = f"recipients_{count}.txt"
+        with open(path, "w", encoding="utf-8") as f:
+            for index in range(count):
+                f.write(f"user{index}@example.com\n")
+        messages_before = smtp.messages
+        get_registry().reset()
+        seconds, success = timed(
+            lambda: sender.send_email(path, content["subject"], content["body"])
+        )
+        delivered = smtp.messages - messages_before
+        smtp_send = stage_stats("smtp_send") or {}
+        results[str(count)] = {
+            "seconds": round(seconds, 4),
+            "messages_per_second": round(delivered / seconds, 1) if seconds else None,
+            "delivered": delivered,
+            "success": success,
+            "smtp_send_mean_seconds": smtp_send.get("mean_seconds"),
+            "smtp_send_max_seconds": smtp_send.get("max_seconds"),
+        }
+    return results
+
+
+def load_previous(path):
+    """读取结果文件中的最后一次结果，没有时返回None。"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                previous = json.loads(line)
+    return previous
+
+
+def compare(current, previous, prefix=""):
+    """逐项比较两次结果中的耗时，返回描述变化的文本行。"""
+    lines = []
+    for key, value in current.items():
+        old = previous.get(key) if isinstance(previous, dict) else None
+        if isinstance(value, dict):
+            lines += compare(value, old, f"{prefix}{key}.")
+        elif key == "seconds" and isinstance(old, (int, float)) and old:
+            change = (value - old) / old * 100
+            lines.append(f"{prefix}{key}: {old} -> {value} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线基准测试")
+    parser.add_argument(
+        "--recipients",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000, 10000, 100000],
+        help="测量 send_email 的收件人数量",
+    )
+    parser.add_argument("--apart-day", type=int, default=7, help="获取日程的天数")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="大模型首字节延迟（秒）")
+    parser.add_argument(
+        "--llm-chunk-delay", type=float, default=0.005, help="流式返回时每个片段的间隔（秒）"
+    )
+    parser.add_argument("--holiday-latency", type=float, default=0.0, help="节假日API延迟（秒）")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="SMTP每封邮件的延迟（秒）")
+    parser.add_argument("--max-connections", type=int, default=4, help="并发SMTP连接数")
+    parser.add_argument(
+        "--output",
+        default=os.path.join(BENCH_DIR, "results.jsonl"),
+        help="结果文件，每次运行追加一行",
+    )
+    args = parser.parse_args()
+
+    # 逐个收件人的日志会影响测量结果
+    logging.disable(logging.INFO)
+
+    output = os.path.abspath(args.output)
+    previous = load_previous(output)
+    with (
+        FakeHolidayAPI(latency=args.holiday_latency) as holiday_api,
+        MockOpenAIServer(
+            latency=args.llm_latency, chunk_delay=args.llm_chunk_delay
+        ) as llm,
+        SMTPSink(latency=args.smtp_latency) as smtp,
+        tempfile.TemporaryDirectory() as workdir,
+    ):
+        os.environ["HOLIDAY_API_URL"] = holiday_api.url
+        os.chdir(workdir)
+        import date_fetcher
+
+        date_fetcher.HOLIDAY_API_URL = holiday_api.url
+
+        results = {
+            "date_fetch_main": bench_date_fetch(holiday_api, args.apart_day),
+            "generate_email_content": bench_generate(llm),
+            "send_email": bench_send(smtp, args.recipients, args.max_connections),
+        }
+        os.chdir(REPO_DIR)
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": vars(args),
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if previous:
+        print(f"\n与上一次结果（{previous.get('commit')}，{previous.get('timestamp')}）比较：")
+        for line in compare(results, previous.get("results", {})):
+            print(f"  {line}")
+    print(f"\n结果已追加到 {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""检查不发送邮件的日子的启动开销。
+
+在临时目录中以 `python -X importtime main.py` 模拟一次既不获取日程也不发送邮件的运行，
+如果加载了大模型、HTTP或SMTP相关模块，或运行时间超过阈值，则以非零状态退出。
+
+用法:
+    python check_startup.py [--max-ms 300]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# 不发送邮件的日子不应加载的模块
+FORBIDDEN_MODULES = ("agno", "openai", "httpx", "dotenv", "smtplib", "sqlite3")
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+
+def imported_modules(importtime_output):
+    """从 -X importtime 的输出中解析出已导入的顶层模块名称。"""
+    modules = set()
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        name = line.rsplit("|", 1)[1].strip()
+        if name != "package":
+            modules.add(name.split(".")[0])
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查空闲日的启动开销")
+    parser.add_argument("--max-ms", type=float, default=300, help="允许的最长运行时间（毫秒）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # 日程表中的发送日期不是今天，且今天不是获取日程的日子
+        tomorrow = datetime.now() + timedelta(days=1)
+        with open(os.path.join(workdir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"holiday": {"date_fetch_weekday": tomorrow.weekday()}}, f)
+        with open(os.path.join(workdir, "date.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                [
+                    {
+                        "isHoliday": True,
+                        "holiday_name": "测试节日",
+                        "nearest_workday": tomorrow.strftime("%Y-%m-%d"),
+                    }
+                ],
+                f,
+                ensure_ascii=False,
+            )
+
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", MAIN_PATH],
+            cwd=workdir,
+            capture_output=True,
+            text=True,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+    loaded = sorted(imported_modules(result.stderr) & set(FORBIDDEN_MODULES))
+    print(f"运行时间：{elapsed_ms:.0f} ms")
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(f"main.py 退出状态为 {result.returncode}")
+    if loaded:
+        sys.exit(f"空闲日加载了不需要的模块：{', '.join(loaded)}")
+    if elapsed_ms > args.max_ms:
+        sys.exit(f"运行时间超过 {args.max_ms:.0f} ms")
+    print("启动检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+from metrics import incr
+
+
+def prompt_hash(prompt):
+    """返回提示词的SHA-256摘要，用于区分不同版本的提示词。"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ContentCache:
+    def __init__(self, db_path="content_cache.db", max_entries=64, ttl_days=30):
+        """初始化邮件内容缓存，按节日名称、模型和提示词摘要保存生成结果。
+
+        参数:
+            db_path (str): 缓存数据库文件路径
+            max_entries (int): 最多保留的条目数，超出时淘汰最久未使用的条目
+            ttl_days (int): 缓存有效天数
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS content ("
+            "holiday_name TEXT NOT NULL, model TEXT NOT NULL, prompt_hash TEXT NOT NULL, "
+            "subject TEXT NOT NULL, body TEXT NOT NULL, "
+            "created_at REAL NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (holiday_name, model, prompt_hash))"
+        )
+        self._conn.commit()
+
+    def get(self, holiday_name, model, prompt):
+        """读取缓存的邮件内容。
+
+        参数:
+            holiday_name (str): 节日名称
+            model (str): 生成内容的模型
+            prompt (str): 生成内容的提示词
+
+        返回:
+            dict | None: 包含主题和正文的邮件内容，未命中或已过期时返回None
+        """
+        key = (holiday_name, model, prompt_hash(prompt))
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT subject, body, created_at FROM content "
+                "WHERE holiday_name = ? AND model = ? AND prompt_hash = ?",
+                key,
+            ).fetchone()
+            if row is None or time.time() - row[2] >= self.ttl_seconds:
+                self.misses += 1
+                incr("content_cache_misses")
+                return None
+            self._conn.execute(
+                "UPDATE content SET last_used = ? "
+                "WHERE holiday_name = ? AND model = ? AND prompt_hash = ?",
+                (time.time(), *key),
+            )
+            self._conn.commit()
+            self.hits += 1
+            incr("content_cache_hits")
+            return {"subject": row[0], "body": row[1]}
+
+    def set(self, holiday_name, model, prompt, content):
+        """写入邮件内容，并淘汰过期和超出容量的条目。
+
+        参数:
+            holiday_name (str): 节日名称
+            model (str): 生成内容的模型
+            prompt (str): 生成内容的提示词
+            content (dict): 包含主题和正文的邮件内容
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO content VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    holiday_name,
+                    model,
+                    prompt_hash(prompt),
+                    content["subject"],
+                    content["body"],
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute(
+                "DELETE FROM content WHERE created_at <= ?", (now - self.ttl_seconds,)
+            )
+            self._conn.execute(
+                "DELETE FROM content WHERE rowid NOT IN ("
+                "SELECT rowid FROM content ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def stats(self):
+        """返回缓存命中统计。"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
@@ -1,33 +1,166 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 from agno.agent import Agent
 from agno.models.openai import OpenAILike
+from agno.run.response import RunResponseContentEvent
+
+from metrics import observe, record_token_usage, stage
+from resilience import ResiliencePolicy
+
+logger = logging.getLogger("ContentGenerator")
+
+SUBJECT_KEYWORDS = ("主题", "标题")
+
+
+def _subject_from_line(line):
+    """从主题行中取出主题文字。"""
+    return line.split("：", 1)[1].strip() if "：" in line else line.strip()
+
+
+class EmailStreamParser:
+    def __init__(self, on_subject=None, max_preamble_lines=5):
+        """初始化流式邮件内容解析器，边接收模型输出边解析主题和正文。
+
+        主题行到达后立即回调 on_subject，之后的输出直接追加到正文。
+        提示词要求输出以主题行开头，因此输出明显不符合格式时立即抛出ValueError，
+        由容错策略重试，不必等待完整输出：主题行的主题为空，或主题行之前的非空行
+        达到 max_preamble_lines 行。符合格式的输出与 parse_email_content 的解析结果相同；
+        与 parse_email_content 不同的是，找不到主题行时不会以第一行作为主题。
+
+        参数:
+            on_subject (callable, 可选): 解析出主题时调用，参数为主题
+            max_preamble_lines (int): 允许出现在主题行之前的非空行数上限（不含），
+                用于容忍模型在主题前输出的简短说明
+        """
+        self.on_subject = on_subject
+        self.max_preamble_lines = max_preamble_lines
+        self.subject = None
+        self._pending = ""
+        self._preamble_lines = 0
+        self._body = []
+
+    def feed(self, chunk):
+        """接收一段模型输出。
+
+        参数:
+            chunk (str): 模型输出的片段
+
+        异常:
+            ValueError: 输出格式错误
+        """
+        if self.subject is not None:
+            self._body.append(chunk)
+            return
+        self._pending += chunk
+        while self.subject is None and "\n" in self._pending:
+            line, self._pending = self._pending.split("\n", 1)
+            self._parse_line(line)
+        if self.subject is not None:
+            self._body.append(self._pending)
+            self._pending = ""
+
+    def _parse_line(self, line):
+        if any(keyword in line for keyword in SUBJECT_KEYWORDS):
+            subject = _subject_from_line(line)
+            if not subject:
+                raise ValueError("模型输出格式错误：邮件主题为空")
+            self.subject = subject
+            if self.on_subject:
+                self.on_subject(subject)
+        elif line.strip():
+            self._preamble_lines += 1
+            if self._preamble_lines >= self.max_preamble_lines:
+                raise ValueError("模型输出格式错误：找不到邮件主题")
+
+    def close(self):
+        """结束解析并返回邮件内容。
+
+        返回:
+            dict: 包含主题和正文的字典
+
+        异常:
+            ValueError: 输出为空或找不到邮件主题
+        """
+        if self.subject is None and self._pending:
+            # 最后一行没有换行符
+            self._parse_line(self._pending)
+            self._pending = ""
+        if self.subject is None:
+            if not self._preamble_lines:
+                raise ValueError("模型返回了空内容")
+            raise ValueError("模型输出格式错误：找不到邮件主题")
+        return {"subject": self.subject, "body": "".join(self._body).strip()}
 
 
 class ContentGenerator:
-    def __init__(self, api_key=None, base_url=None, model=None):
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        model=None,
+        cache=None,
+        fallback=None,
+        policy=None,
+        stream=False,
+    ):
         """初始化ContentGenerator，设置OpenAI参数。
 
         参数:
             api_key (str, 可选): OpenAI API密钥。默认从环境变量获取。
             base_url (str, 可选): OpenAI API基础URL。默认从环境变量获取。
             model (str, 可选): 要使用的OpenAI模型。默认从环境变量获取或使用'gpt-3.5-turbo'。
+            cache (ContentCache, 可选): 邮件内容缓存，为None时不使用缓存
+            fallback (dict, 可选): 备用模型，包含base_url、api_key和model，
+                主模型多次失败后改用备用模型
+            policy (ResiliencePolicy, 可选): 调用大模型的超时、重试和对冲策略
+            stream (bool): 是否以流式方式接收邮件内容，主题到达后即可开始后续工作
+        """
+        self.stream = stream
+        self.policy = policy or ResiliencePolicy()
+        self.agent_models = [self._create_model(base_url, api_key, model)]
+        if fallback:
+            self.agent_models.append(
+                self._create_model(
+                    fallback["base_url"], fallback["api_key"], fallback["model"]
+                )
+            )
+        self.model = model
+        self.cache = cache
+        # 同一节日同时只生成一次，并发请求等待首个请求的结果
+        self._locks = defaultdict(threading.Lock)
+
+    def _create_model(self, base_url, api_key, model):
+        """创建调用大模型的模型对象。
+
+        每个端点使用一个长期存在的HTTP客户端，多次调用之间复用连接，
+        常驻运行时不必每次重新建立TCP和TLS连接。
         """
-        # 优先使用环境变量中的设置
-        agent_model = OpenAILike(base_url=base_url, api_key=api_key, id=model)
-        self.client = Agent(name="Master Email Writer", model=agent_model)
+        # 超时和重试由 policy 统一处理，客户端本身不再重试
+        return OpenAILike(
+            base_url=base_url,
+            api_key=api_key,
+            id=model,
+            timeout=self.policy.timeout,
+            max_retries=0,
+            http_client=httpx.Client(timeout=self.policy.timeout),
+        )
 
-    def generate_email_content(self, holiday_name):
-        """根据特殊日期生成邮件内容。
+    def build_prompt(self, holiday_name):
+        """构建生成邮件内容的提示词。
 
         参数:
             holiday_name (str): 节气名称
 
         返回:
-            dict: 生成的邮件内容，包含主题和正文
+            str: 提示词
         """
-        if not self.client:
-            raise ValueError("生成内容需要OpenAI API密钥")
-
-        prompt = f"""
+        return f"""
         **User Prompt：** 
 
         请为节日 **{holiday_name}** 生成一封温暖得体的双语祝福邮件，受众为中外混合团队的同事。邮件需包含以下要素：  
@@ -64,9 +197,201 @@ class ContentGenerator:
         The Lunar New Year marks a time for reunion and new beginnings…（英文内容） 
         """
 
-        response = self.client.run(prompt)
+    def generate_email_content(self, holiday_name, on_subject=None):
+        """根据特殊日期生成邮件内容，优先读取缓存。
+
+        参数:
+            holiday_name (str): 节气名称
+            on_subject (callable, 可选): 流式生成时解析出主题后调用，参数为主题；
+                重试时可能被多次调用，以返回的内容为准。命中缓存时不会调用
+
+        返回:
+            dict: 生成的邮件内容，包含主题和正文
+        """
+        prompt = self.build_prompt(holiday_name)
+        with self._locks[holiday_name]:
+            if self.cache is not None:
+                content = self.cache.get(holiday_name, self.model, prompt)
+                if content is not None:
+                    return content
+
+            if self.stream:
+                content = self._stream_generate(prompt, on_subject)
+            else:
+                content = self._generate(prompt)
+            if self.cache is not None:
+                self.cache.set(holiday_name, self.model, prompt, content)
+            return content
+
+    def pregenerate(self, holiday_names):
+        """提前为多个节日生成邮件内容并写入缓存。
+
+        预生成只是优化，某个节日生成失败时记录警告并继续，发送时会重新生成。
+
+        参数:
+            holiday_names (list): 节日名称列表
+
+        返回:
+            dict: 节日名称到邮件内容的映射，生成失败的节日不包含在内
+        """
+        contents = {}
+        for holiday_name in dict.fromkeys(holiday_names):
+            try:
+                contents[holiday_name] = self.generate_email_content(holiday_name)
+            except Exception as e:
+                logger.warning(f"预生成{holiday_name}的邮件内容失败：{str(e)}")
+        return contents
+
+    def build_greeting_prompt(self, holiday_name, variants):
+        """构建为多个团队/语言组合批量生成问候语的提示词。
+
+        参数:
+            holiday_name (str): 节气名称
+            variants (list): (团队, 语言) 元组列表
+
+        返回:
+            str: 提示词
+        """
+        lines = "\n".join(
+            f"- {index}: 团队「{team or '全体同事'}」，语言 {locale or 'zh-CN'}"
+            for index, (team, locale) in enumerate(variants)
+        )
+        return f"""
+        请为节日 **{holiday_name}** 给以下每个团队各写一句简短的节日问候（不超过60字），
+        内容要结合该团队的工作特点，并使用指定的语言：
+        {lines}
+
+        **输出要求：**
+        - 只输出一个JSON对象，键为上面的编号（字符串），值为对应的问候语
+        - 不要输出其他内容，不要带有任何格式符号
+        """
+
+    def generate_greetings(self, holiday_name, variants, batch_size=4, max_workers=4):
+        """为多个团队/语言组合生成问候语，每次调用批量生成多个，且多个批次并发执行。
+
+        调用次数只与组合数量有关，与收件人数量无关。
+
+        参数:
+            holiday_name (str): 节气名称
+            variants (list): (团队, 语言) 元组列表
+            batch_size (int): 每次调用生成的问候语数量
+            max_workers (int): 最大并发调用数
+
+        返回:
+            dict: (团队, 语言) 到问候语的映射，生成失败的组合不包含在内
+        """
+        batches = [
+            variants[start : start + batch_size]
+            for start in range(0, len(variants), batch_size)
+        ]
+
+        def parse(text):
+            text = text.strip()
+            data = json.loads(text[text.find("{") : text.rfind("}") + 1])
+            if not isinstance(data, dict):
+                raise ValueError("问候语必须是JSON对象")
+            return text, data
+
+        def generate(batch):
+            prompt = self.build_greeting_prompt(holiday_name, batch)
+            if self.cache is not None:
+                content = self.cache.get(holiday_name, self.model, prompt)
+                if content is not None:
+                    return batch, parse(content["body"])[1]
+            # 输出无法解析时也会重试，全部失败的批次不生成问候语
+            try:
+                text, data = self._run(
+                    "Greeting Writer",
+                    lambda agent: parse(agent.run(prompt).content or ""),
+                )
+            except Exception:
+                return batch, None
+            if self.cache is not None:
+                self.cache.set(
+                    holiday_name, self.model, prompt, {"subject": "", "body": text}
+                )
+            return batch, data
+
+        greetings = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch, data in executor.map(generate, batches):
+                for index, variant in enumerate(batch):
+                    greeting = (data or {}).get(str(index))
+                    if isinstance(greeting, str) and greeting.strip():
+                        greetings[variant] = greeting.strip()
+        return greetings
+
+    def _run(self, name, run):
+        """按容错策略调用大模型，依次尝试主模型和备用模型。
+
+        参数:
+            name (str): Agent名称
+            run (callable): 接收Agent、调用模型并解析输出的函数，输出无效时应抛出ValueError以触发重试
+
+        返回:
+            run 的返回值
+        """
+
+        def endpoint(agent_model):
+            def call():
+                # 每次调用使用独立的Agent，以便多个请求可以并发进行
+                agent = Agent(name=name, model=agent_model)
+                try:
+                    with stage("llm_call"):
+                        return run(agent)
+                finally:
+                    record_token_usage(getattr(agent.run_response, "metrics", None))
+
+            return call
+
+        return self.policy.call(*(endpoint(model) for model in self.agent_models))
+
+    def _generate(self, prompt):
+        """调用大模型生成邮件内容并解析主题和正文。"""
+        return self._run(
+            "Master Email Writer",
+            lambda agent: self.parse_email_content(agent.run(prompt).content or ""),
+        )
+
+    def _stream_generate(self, prompt, on_subject=None):
+        """以流式方式调用大模型，边接收边解析主题和正文，格式错误时立即停止接收。"""
 
-        content = response.content
+        def run(agent):
+            start = time.perf_counter()
+
+            def subject_received(subject):
+                observe("llm_time_to_subject", time.perf_counter() - start)
+                if on_subject:
+                    on_subject(subject)
+
+            parser = EmailStreamParser(subject_received)
+            events = agent.run(prompt, stream=True)
+            try:
+                for event in events:
+                    if isinstance(event, RunResponseContentEvent) and event.content:
+                        parser.feed(event.content)
+            finally:
+                # 提前停止时关闭响应流，释放连接
+                events.close()
+            return parser.close()
+
+        return self._run("Master Email Writer", run)
+
+    @staticmethod
+    def parse_email_content(content):
+        """从模型输出中解析主题和正文。
+
+        参数:
+            content (str): 模型输出
+
+        返回:
+            dict: 包含主题和正文的字典
+
+        异常:
+            ValueError: 输出为空
+        """
+        if not content.strip():
+            raise ValueError("模型返回了空内容")
 
         # 解析响应以提取主题和正文
         lines = content.strip().split("\n")
@@ -74,10 +399,8 @@ class ContentGenerator:
         body = ""
 
         for i, line in enumerate(lines):
-            if "主题" in line or "标题" in line:
-                subject = (
-                    line.split("：", 1)[1].strip() if "：" in line else line.strip()
-                )
+            if any(keyword in line for keyword in SUBJECT_KEYWORDS):
+                subject = _subject_from_line(line)
                 body = "\n".join(lines[i + 1 :]).strip()
                 break
 
@@ -1,53 +1,227 @@
+import asyncio
+import logging
+import os
+import threading
 from datetime import datetime, timedelta
 
 import httpx
-from agno.agent import Agent
-from agno.models.openai import OpenAILike
-from dotenv import load_dotenv
 
-load_dotenv()
+from holiday_cache import HolidayCache
+from holiday_index import HolidayIndex
+from metrics import record_token_usage, stage
+from resilience import ResiliencePolicy, backoff_delay
+from schedule_store import ScheduleStore, parse_schedule
 
+logger = logging.getLogger("DateFetcher")
 
-def is_working_date_tool(date: str) -> dict:
-    """将判断日期是否为工作日"""
-    target_date = datetime.strptime(date, "%Y-%m-%d").date()
-    api_link = rf"https://holiday.dreace.top/?date={target_date}"
+
+# 可通过环境变量指向其他兼容的节假日API，例如离线基准测试使用的本地服务
+HOLIDAY_API_URL = os.environ.get("HOLIDAY_API_URL", "https://holiday.dreace.top/")
+
+# 向前查找最近工作日的最大天数
+MAX_WORKDAY_SEARCH_DAY = 31
+
+_holiday_cache = None
+_holiday_index = None
+_http_client = None
+# 节假日API的超时和重试策略
+_http_policy = ResiliencePolicy(timeout=10, retries=2, backoff=0.5)
+# Agent 模式下每个大模型接口复用的HTTP客户端
+_llm_clients = {}
+_llm_clients_lock = threading.Lock()
+# 保护 date.json 的读取、合并和写回
+_schedule_lock = threading.Lock()
+
+
+def configure_holiday_cache(db_path="holiday_cache.db", ttl_days=30):
+    """设置节假日缓存的存储路径和有效期。
+
+    参数:
+        db_path (str): 缓存数据库文件路径
+        ttl_days (int): 缓存有效天数
+    """
+    global _holiday_cache
+    if _holiday_cache is not None:
+        _holiday_cache.close()
+    _holiday_cache = HolidayCache(db_path=db_path, ttl_days=ttl_days)
+    return _holiday_cache
+
+
+def configure_holiday_index(index_dir="holiday_index", max_age_days=30):
+    """设置年度节假日索引的存储目录和有效期。
+
+    参数:
+        index_dir (str): 索引文件所在目录
+        max_age_days (int): 索引有效天数
+    """
+    global _holiday_index
+    _holiday_index = HolidayIndex(index_dir=index_dir, max_age_days=max_age_days)
+    return _holiday_index
+
+
+def get_holiday_index():
+    """返回当前使用的年度节假日索引，未配置时使用默认设置创建。"""
+    if _holiday_index is None:
+        configure_holiday_index()
+    return _holiday_index
+
+
+def get_holiday_cache():
+    """返回当前使用的节假日缓存，未配置时使用默认设置创建。"""
+    if _holiday_cache is None:
+        configure_holiday_cache()
+    return _holiday_cache
+
+
+def configure_holiday_http(timeout=10, retries=2, backoff=0.5):
+    """设置请求节假日API的超时和重试。
+
+    参数:
+        timeout (float): 每次请求的超时时间（秒）
+        retries (int): 请求失败后的重试次数
+        backoff (float): 首次重试前等待的秒数
+    """
+    global _http_client, _http_policy
+    _http_policy = ResiliencePolicy(timeout=timeout, retries=retries, backoff=backoff)
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+    return _http_policy
+
+
+def get_http_client():
+    """返回复用连接的HTTP客户端，常驻运行时避免重复建立连接。"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(timeout=_http_policy.timeout)
+    return _http_client
+
+
+def get_llm_http_client(base_url, timeout):
+    """返回某个大模型接口复用连接的HTTP客户端，多次获取日程之间不重复建立连接。
+
+    参数:
+        base_url (str): 大模型接口地址
+        timeout (float): 请求超时（秒）
+
+    返回:
+        httpx.Client: HTTP客户端
+    """
+    with _llm_clients_lock:
+        client = _llm_clients.get(base_url)
+        if client is None:
+            client = _llm_clients[base_url] = httpx.Client(timeout=timeout)
+        return client
+
+
+def fetch_holiday_data(date):
+    """请求节假日API获取指定日期的原始数据，失败时按重试策略重试。
+
+    参数:
+        date (str): 日期，格式为YYYY-MM-DD
+
+    返回:
+        dict | None: API返回的数据，多次请求失败时返回None
+    """
+
+    def request():
+        with stage("holiday_api"):
+            response = get_http_client().get(HOLIDAY_API_URL, params={"date": date})
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        return _http_policy.call(request)
+    except (httpx.HTTPError, ValueError, TimeoutError) as e:
+        logger.warning(f"获取 {date} 的节假日数据失败：{str(e)}")
+        return None
+
+
+def classify_holiday_data(data):
+    """将节假日API数据转换为工具返回格式。
+
+    参数:
+        data (dict): 节假日API返回的数据
+
+    返回:
+        dict: 包含isHoliday、note、holiday_name和date的字典
+    """
     # 处理周末
-    response = httpx.get(api_link)
-    if response.status_code == 200:
-        data = response.json()
-        if data["isHoliday"]:
-            if data["note"] == "周末":
-                return {
-                    "isHoliday": False,
-                    "note": "周末",
-                    "holiday_name": data["note"],
-                    "date": data["date"],
-                }
-            else:
-                return {
-                    "isHoliday": True,
-                    "note": "节日",
-                    "holiday_name": data["note"],
-                    "date": data["date"],
-                }
-        else:
+    if data["isHoliday"]:
+        if data["note"] == "周末":
             return {
                 "isHoliday": False,
-                "note": "工作日",
+                "note": "周末",
+                "holiday_name": data["note"],
+                "date": data["date"],
+            }
+        else:
+            return {
+                "isHoliday": True,
+                "note": "节日",
                 "holiday_name": data["note"],
                 "date": data["date"],
             }
+    else:
+        return {
+            "isHoliday": False,
+            "note": "工作日",
+            "holiday_name": data["note"],
+            "date": data["date"],
+        }
+
+
+def is_working_date_tool(date: str) -> dict:
+    """将判断日期是否为工作日"""
+    with stage("tool_is_working_date"):
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+        data = get_holiday_cache().get_or_fetch(str(target_date), fetch_holiday_data)
+    if data:
+        return classify_holiday_data(data)
 
     return {}
 
 
-def create_return_json(response_data):
+def save_schedule(entries, window=None):
+    """将日程合并到 date.json。
+
+    参数:
+        entries (list): 校验通过的日程列表
+        window (tuple, 可选): 本次获取覆盖的发送日期范围，范围内原有的日程被替换
     """
-    根据 Agent 返回的信息创建 json 文件
+    # 读取、合并和写回需要作为一个整体，避免并发写入时互相覆盖
+    with _schedule_lock:
+        store = ScheduleStore()
+        store.merge(entries, window=window)
+        store.save()
+
+
+def create_return_json_tool(collected):
+    """创建供 Agent 调用的 create_return_json 工具。
+
+    工具只校验并收集日程，不写入文件：超时或被对冲请求取代的 Agent 仍可能在后台调用工具，
+    由 agent_fetch 在确定采用哪一次调用后统一保存。
+
+    参数:
+        collected (list): 校验通过的日程追加到该列表
+
+    返回:
+        callable: create_return_json 工具函数
     """
-    with open("date.json", "w", encoding="utf-8") as f:
-        f.write(response_data)
+
+    def create_return_json(response_data):
+        """
+        根据 Agent 返回的信息校验日程，返回处理结果
+        """
+        with stage("tool_create_return_json"):
+            try:
+                entries = parse_schedule(response_data)
+            except ValueError as e:
+                return f"JSON格式错误，请重新输出：{str(e)}"
+            collected.extend(entries)
+        return f"已记录 {len(entries)} 条日程"
+
+    return create_return_json
 
 
 def is_run(date_fetch_weekday):
@@ -57,17 +231,25 @@ def is_run(date_fetch_weekday):
     return datetime.now().weekday() == date_fetch_weekday
 
 
-def date_fetch_main(base_url, api_key, model, apart_day, date_fetch_weekday):
-    """获取未来日期中是否存在节日
+def agent_fetch(base_url, api_key, model, apart_day, fallback=None, policy=None):
+    """使用 Agent 逐日调用工具获取节假日，并将采用的那次调用的结果写入 date.json
 
     参数:
-        base_url (str, 可选): OpenAI API基础URL。默认从环境变量获取。
-        api_key (str, 可选): OpenAI API密钥。默认从环境变量获取。
-        model (str, 可选): 要使用的OpenAI模型。默认从环境变量获取或使用'gpt-3.5-turbo'。
-        apart_day (int, 可选): 两个日期之间的间隔
-        date_fetch_weekday (int, 可选): 每周星期几获取日期
+        base_url (str): OpenAI API基础URL
+        api_key (str): OpenAI API密钥
+        model (str): 要使用的OpenAI模型
+        apart_day (int): 两个日期之间的间隔
+        fallback (dict, 可选): 备用模型，包含base_url、api_key和model
+        policy (ResiliencePolicy, 可选): 调用大模型的超时、重试和对冲策略
     """
-    agent_model = OpenAILike(base_url=base_url, api_key=api_key, id=model)
+    # 只有 Agent 模式才需要加载大模型相关模块
+    from agno.agent import Agent
+    from agno.models.openai import OpenAILike
+
+    policy = policy or ResiliencePolicy()
+    endpoints = [{"base_url": base_url, "api_key": api_key, "model": model}]
+    if fallback:
+        endpoints.append(fallback)
     prompt = f"""
     # 你是一个中国节假日数据处理大师，请帮完成以下需求：
     ### 需求：
@@ -86,10 +268,236 @@ def date_fetch_main(base_url, api_key, model, apart_day, date_fetch_weekday):
     - 如果是连续的节日，只需返回第一个节日的日期即可
     - 如果返回的节假日中存在相同工作日，请把他们合并为一个
     """
-    if is_run(date_fetch_weekday):
-        agent = Agent(
-            tools=[is_working_date_tool, create_return_json],
-            name="Date Assist",
-            model=agent_model,
+
+    def endpoint(settings):
+        def call():
+            # 每次调用单独收集日程，只有被采用的那次调用的结果会写入 date.json
+            collected = []
+            agent = Agent(
+                tools=[is_working_date_tool, create_return_json_tool(collected)],
+                name="Date Assist",
+                model=OpenAILike(
+                    base_url=settings["base_url"],
+                    api_key=settings["api_key"],
+                    id=settings["model"],
+                    timeout=policy.timeout,
+                    max_retries=0,
+                    http_client=get_llm_http_client(
+                        settings["base_url"], policy.timeout
+                    ),
+                ),
+            )
+            try:
+                with stage("agent_fetch"):
+                    agent.run(prompt)
+            finally:
+                record_token_usage(getattr(agent.run_response, "metrics", None))
+            return collected
+
+        return call
+
+    entries = policy.call(*(endpoint(settings) for settings in endpoints))
+    save_schedule(entries)
+
+
+async def _fetch_days_async(dates, max_concurrency=10):
+    """并发获取多个日期的节假日数据，优先读取缓存。
+
+    参数:
+        dates (list): 日期列表，格式为YYYY-MM-DD
+        max_concurrency (int): 最大并发请求数
+
+    返回:
+        dict: 日期到工具返回格式数据的映射
+    """
+    cache = get_holiday_cache()
+    results = {}
+    missing = []
+    for date in dates:
+        data = cache.get(date)
+        if data is None:
+            missing.append(date)
+        else:
+            results[date] = classify_holiday_data(data)
+
+    if missing:
+        semaphore = asyncio.Semaphore(max_concurrency)
+        limits = httpx.Limits(
+            max_connections=max_concurrency, max_keepalive_connections=max_concurrency
         )
-        agent.run(prompt)
+        policy = _http_policy
+        async with httpx.AsyncClient(limits=limits, timeout=policy.timeout) as client:
+
+            async def fetch(date):
+                for attempt in range(policy.retries + 1):
+                    if attempt:
+                        await asyncio.sleep(backoff_delay(attempt, policy.backoff))
+                    try:
+                        async with semaphore:
+                            with stage("holiday_api"):
+                                response = await client.get(
+                                    HOLIDAY_API_URL, params={"date": date}
+                                )
+                        response.raise_for_status()
+                        data = response.json()
+                    except httpx.HTTPError:
+                        if attempt == policy.retries:
+                            raise
+                        continue
+                    # 每个日期成功后立即写入缓存，其他日期失败时不必重新请求
+                    cache.set(date, data)
+                    results[date] = classify_holiday_data(data)
+                    return
+
+            # 等待所有请求结束后再抛出第一个错误，避免丢弃已成功的结果
+            errors = [
+                error
+                for error in await asyncio.gather(
+                    *(fetch(d) for d in missing), return_exceptions=True
+                )
+                if error is not None
+            ]
+            if errors:
+                raise errors[0]
+
+    return results
+
+
+def group_holidays(days, previous_workday):
+    """将连续的节假日合并，并找到每段节假日前的最近工作日。
+
+    参数:
+        days (list): 按日期排序的工具返回格式数据
+        previous_workday (callable): 接收日期并返回其之前最近工作日的函数
+
+    返回:
+        list: 与 date.json 格式一致的节假日列表
+    """
+    schedule = []
+    in_run = False
+    for day in days:
+        if day["note"] == "工作日":
+            in_run = False
+            continue
+        if not day["isHoliday"]:
+            # 周末不打断连续的节假日，也不单独构成节日
+            continue
+        if in_run:
+            continue
+        in_run = True
+        nearest_workday = previous_workday(day["date"])
+        # 如果返回的节假日中存在相同工作日，则合并为一个
+        if schedule and schedule[-1]["nearest_workday"] == nearest_workday:
+            schedule[-1]["holiday_name"] += f"、{day['holiday_name']}"
+        else:
+            schedule.append(
+                {
+                    "isHoliday": True,
+                    "holiday_name": day["holiday_name"],
+                    "nearest_workday": nearest_workday,
+                }
+            )
+    return schedule
+
+
+def scan_holidays(apart_day, max_concurrency=10):
+    """不经过大模型，直接根据预计算的年度索引计算发送日程
+
+    参数:
+        apart_day (int): 两个日期之间的间隔
+        max_concurrency (int): 构建索引时的最大并发请求数
+
+    返回:
+        list: 与 date.json 格式一致的节假日列表
+    """
+    today = datetime.now().date()
+    end = today + timedelta(days=apart_day)
+    # 多加载一段之前的日期，用于查找节假日前的工作日
+    start = today - timedelta(days=MAX_WORKDAY_SEARCH_DAY)
+    index = get_holiday_index()
+    with stage("holiday_index"):
+        index.ensure_years(
+            range(start.year, end.year + 1),
+            lambda dates: asyncio.run(_fetch_days_async(dates, max_concurrency)),
+        )
+
+    def previous_workday(date):
+        workday = index.previous_workday(date)
+        if workday is None:
+            raise LookupError(f"找不到 {date} 之前的工作日")
+        return str(workday)
+
+    window = [index.day(today + timedelta(days=offset)) for offset in range(apart_day + 1)]
+    return group_holidays(window, previous_workday)
+
+
+def fetch_schedule(
+    base_url,
+    api_key,
+    model,
+    apart_day,
+    mode="scan",
+    max_concurrency=10,
+    fallback=None,
+    policy=None,
+):
+    """获取未来日期中的节日并写入 date.json，不检查今天是否为获取日
+
+    参数:
+        base_url (str): OpenAI API基础URL
+        api_key (str): OpenAI API密钥
+        model (str): 要使用的OpenAI模型
+        apart_day (int): 两个日期之间的间隔
+        mode (str, 可选): 获取方式，"scan"为查询年度索引，"agent"为使用大模型
+        max_concurrency (int, 可选): 构建年度索引时的最大并发请求数
+        fallback (dict, 可选): Agent 模式的备用模型
+        policy (ResiliencePolicy, 可选): Agent 模式调用大模型的容错策略
+
+    返回:
+        dict: 节假日缓存命中统计
+    """
+    if mode == "scan":
+        try:
+            schedule = scan_holidays(apart_day, max_concurrency)
+        except (httpx.HTTPError, LookupError, ValueError, TypeError) as e:
+            # 网络错误、接口返回格式异常或找不到工作日时改用 Agent
+            logger.error(f"扫描节假日失败，改用 Agent 获取：{str(e)}")
+        else:
+            # 重新扫描的范围内以本次结果为准
+            today = datetime.now().date()
+            save_schedule(
+                schedule,
+                window=(str(today), str(today + timedelta(days=apart_day))),
+            )
+            return get_holiday_cache().stats()
+    agent_fetch(base_url, api_key, model, apart_day, fallback, policy)
+    return get_holiday_cache().stats()
+
+
+def date_fetch_main(
+    base_url,
+    api_key,
+    model,
+    apart_day,
+    date_fetch_weekday,
+    mode="scan",
+    max_concurrency=10,
+):
+    """获取未来日期中是否存在节日
+
+    参数:
+        base_url (str, 可选): OpenAI API基础URL。默认从环境变量获取。
+        api_key (str, 可选): OpenAI API密钥。默认从环境变量获取。
+        model (str, 可选): 要使用的OpenAI模型。默认从环境变量获取或使用'gpt-3.5-turbo'。
+        apart_day (int, 可选): 两个日期之间的间隔
+        date_fetch_weekday (int, 可选): 每周星期几获取日期
+        mode (str, 可选): 获取方式，"scan"为查询年度索引，"agent"为使用大模型
+        max_concurrency (int, 可选): 构建年度索引时的最大并发请求数
+
+    返回:
+        dict: 本次运行的节假日缓存命中统计
+    """
+    if is_run(date_fetch_weekday):
+        return fetch_schedule(base_url, api_key, model, apart_day, mode, max_concurrency)
+
+    return get_holiday_cache().stats()
@@ -0,0 +1,105 @@
+import html
+import re
+from functools import lru_cache
+
+# 预编译Markdown格式的正则表达式
+BOLD_PATTERN = re.compile(r"\*\*(.+?)\*\*")
+ITALIC_PATTERN = re.compile(r"\*(.+?)\*")
+UNORDERED_ITEM_PATTERN = re.compile(r"^\s*[-*+]\s+(.*)$")
+ORDERED_ITEM_PATTERN = re.compile(r"^\s*\d+[.、)]\s+(.*)$")
+
+# 邮件HTML模板只构建一次，渲染时直接拼接正文
+HTML_HEAD = """
+<html>
+<head>
+    <style>
+        body { font-family: Arial, sans-serif; line-height: 1.6; }
+        .container { max-width: 600px; margin: 0 auto; padding: 20px; }
+        .footer { margin-top: 30px; font-size: 12px; color: #777; }
+    </style>
+</head>
+<body>
+    <div class="container">
+"""
+HTML_TAIL = """
+        <div class="footer">
+            <p>此邮件由公司文化部发送</p>
+            <p>如有疑问，请联系文化部：culture@company.com</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+def render_inline(text):
+    """转义HTML特殊字符，并处理加粗和斜体。"""
+    text = html.escape(text, quote=False)
+    text = BOLD_PATTERN.sub(r"<strong>\1</strong>", text)
+    return ITALIC_PATTERN.sub(r"<em>\1</em>", text)
+
+
+def markdown_to_html(body):
+    """将简单的Markdown文本转换为HTML片段。
+
+    空行分隔段落，段落内换行转换为<br>，连续的列表项合并到同一个<ul>或<ol>中。
+
+    参数:
+        body (str): Markdown格式的正文
+
+    返回:
+        str: HTML片段
+    """
+    blocks = []
+    paragraph = []
+    list_tag = None
+    items = []
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append("<p>" + "<br>".join(paragraph) + "</p>")
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            blocks.append(f"<{list_tag}>" + "".join(items) + f"</{list_tag}>")
+            items.clear()
+            list_tag = None
+
+    for line in body.splitlines():
+        if not line.strip():
+            close_paragraph()
+            close_list()
+            continue
+        match = UNORDERED_ITEM_PATTERN.match(line)
+        tag = "ul"
+        if not match:
+            match = ORDERED_ITEM_PATTERN.match(line)
+            tag = "ol"
+        if match:
+            close_paragraph()
+            if list_tag != tag:
+                close_list()
+                list_tag = tag
+            items.append(f"<li>{render_inline(match.group(1))}</li>")
+        else:
+            close_list()
+            paragraph.append(render_inline(line.strip()))
+
+    close_paragraph()
+    close_list()
+    return "\n".join(blocks)
+
+
+@lru_cache(maxsize=64)
+def render_email_html(body):
+    """将邮件正文渲染为完整的HTML邮件。
+
+    参数:
+        body (str): Markdown格式的正文
+
+    返回:
+        str: 完整的HTML文档
+    """
+    return HTML_HEAD + markdown_to_html(body) + HTML_TAIL
@@ -1,8 +1,24 @@
 import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.header import Header
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.utils import formataddr
 import logging
+from email.policy import compat32
+
+from email_renderer import render_email_html
+from metrics import stage
+from rate_limiter import AdaptiveRateLimiter
+from recipient_source import chunked, dedupe, iter_recipients
+from smtp_pool import DeliveryEngine, DeliveryResult, SMTPConnectionPool
+
+# 直接生成以CRLF结尾的字节，发送时无需再转换换行符
+SMTP_POLICY = compat32.clone(linesep="\r\n")
+
+# 一次投递包含多个收件人时使用的To头，避免泄露其他收件人地址
+UNDISCLOSED_RECIPIENTS = "undisclosed-recipients:;"
 
 
 class EmailSender:
@@ -14,6 +30,12 @@ class EmailSender:
         password,
         sender_name="AI节日邮件",
         ssl=True,
+        max_connections=4,
+        rcpt_per_message=1,
+        rate_limit=0,
+        max_retries=3,
+        chunk_size=1000,
+        starttls=True,
     ):
         """初始化邮件发送器，设置SMTP服务器详细信息。
 
@@ -24,6 +46,13 @@ class EmailSender:
             password (str): SMTP密码
             sender_name (str): 显示的发件人名称
             ssl (bool): 是否使用SSL连接，默认为True
+            max_connections (int): 并发使用的最大SMTP连接数，默认为4
+            rcpt_per_message (int): 每次投递包含的收件人数，默认为1（每人单独一封）
+            rate_limit (float): 每秒最多发送的邮件数，默认为0（不限速）
+            max_retries (int): 遇到4xx临时错误时的最大重试次数，默认为3
+            chunk_size (int): 每次从收件人来源读取并投递的收件人数，默认为1000
+            starttls (bool): 不使用SSL时是否启用STARTTLS，默认为True；
+                只应对本机或内网中不支持加密的服务器关闭
         """
         self.smtp_server = smtp_server
         self.smtp_port = smtp_port
@@ -31,6 +60,12 @@ class EmailSender:
         self.password = password
         self.sender_name = sender_name
         self.use_ssl = ssl
+        self.max_connections = max_connections
+        self.rcpt_per_message = rcpt_per_message
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.starttls = starttls
 
         # 设置日志记录
         logging.basicConfig(
@@ -40,87 +75,154 @@ class EmailSender:
         )
         self.logger = logging.getLogger("EmailSender")
 
-    def send_email(self, recipients, subject, body):
-        """向指定收件人发送邮件。
+    def _connect(self):
+        """建立并登录一个SMTP连接。
+
+        返回:
+            smtplib.SMTP: 已登录的SMTP连接
+        """
+        # 简化连接方式，统一处理SSL和非SSL连接
+        with stage("smtp_connect"):
+            if self.use_ssl:
+                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
+                self.logger.info("使用SSL连接SMTP服务器成功，正在进行身份验证...")
+            else:
+                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+                if self.starttls:
+                    server.starttls()  # 启用TLS加密
+                    self.logger.info("使用TLS连接SMTP服务器成功，正在进行身份验证...")
+                else:
+                    self.logger.info("连接SMTP服务器成功（未加密），正在进行身份验证...")
+
+        # 登录
+        with stage("smtp_login"):
+            server.login(self.username, self.password)
+        return server
+
+    def build_message(self, subject, html_body):
+        """构建不含收件人的邮件，并序列化为字节。
 
         参数:
-            recipients (list): 收件人邮箱地址列表
             subject (str): 邮件主题
-            body (str): 邮件正文（HTML格式）
+            html_body (str): HTML格式的邮件正文
 
         返回:
-            bool: 发送成功返回True，否则返回False
+            bytes: 以CRLF换行的邮件内容，不含To头
         """
-        msg = MIMEMultipart()
-        msg["From"] = formataddr((self.sender_name, self.username))
-        msg["Subject"] = subject
-
-        # 添加HTML正文
-        # 预处理需要替换的内容，包括markdown格式转换
-        # 处理markdown格式：加粗、斜体、列表等
-        body_html = body.replace("\n", "<br>")
-        # 处理加粗文本 **text** -> <strong>text</strong>
-        import re
-
-        body_html = re.sub(r"\*\*(.*?)\*\*", r"<strong>\1</strong>", body_html)
-        # 处理斜体文本 *text* -> <em>text</em>
-        body_html = re.sub(r"\*(.*?)\*", r"<em>\1</em>", body_html)
-        # 处理无序列表项 - item -> <li>item</li>
-        body_html = re.sub(r"<br>- (.*?)<br>", r"<br><li>\1</li><br>", body_html)
-        # 处理有序列表项 1. item -> <li>item</li>
-        body_html = re.sub(r"<br>\d+\. (.*?)<br>", r"<br><li>\1</li><br>", body_html)
-
-        html_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .footer {{ margin-top: 30px; font-size: 12px; color: #777; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                {body_html}
-
-                <div class="footer">
-                    <p>此邮件由公司文化部发送</p>
-                    <p>如有疑问，请联系文化部：culture@company.com</p>
-                </div>
-            </div>
-        </body>
-        </html>
+        with stage("mime_build"):
+            msg = MIMEMultipart()
+            msg["From"] = formataddr((self.sender_name, self.username))
+            msg["Subject"] = subject
+            msg.attach(MIMEText(html_body, "html"))
+            return msg.as_bytes(policy=SMTP_POLICY)
+
+    @staticmethod
+    def address_message(recipient, message):
+        """在已序列化的邮件前拼接收件人的To头。
+
+        参数:
+            recipient (str): 收件人邮箱地址
+            message (bytes): build_message 返回的邮件内容
+
+        返回:
+            bytes: 可直接交给 sendmail 的邮件内容
         """
-        msg.attach(MIMEText(html_body, "html"))
+        return b"To: " + Header(recipient).encode().encode("ascii") + b"\r\n" + message
 
-        # 连接SMTP服务器并发送邮件
+    def open_pool(self):
+        """创建连接池并预先建立一个已登录的连接，可在生成邮件内容的同时提前完成。
+
+        返回:
+            SMTPConnectionPool: 连接池，使用完毕后由调用方关闭
+        """
         self.logger.info(f"正在连接SMTP服务器 {self.smtp_server}:{self.smtp_port}...")
+        pool = SMTPConnectionPool(self._connect, self.max_connections)
+        pool.release(pool.acquire())
+        self.logger.info("身份验证成功")
+        return pool
+
+    def send_email(
+        self, recipients, subject, body, journal=None, personalize=None, pool=None
+    ):
+        """向指定收件人并发发送邮件，单个收件人失败不影响其他收件人。
+
+        参数:
+            recipients: 收件人来源，可以是列表、生成器或文件路径，详见 iter_recipients
+            subject (str): 邮件主题
+            body (str): 邮件正文（Markdown格式）
+            journal (SendJournal, 可选): 发送日志，已记录的收件人会被跳过
+            personalize (callable, 可选): 接收 Recipient 并返回其个性化正文的函数，
+                为None时所有收件人共用同一封邮件
+            pool (SMTPConnectionPool, 可选): open_pool 返回的连接池，由调用方负责关闭
+
+        返回:
+            bool: 全部发送成功返回True，否则返回False
+        """
+        # 添加HTML正文，将markdown格式转换为HTML
+        html_body = render_email_html(body)
+
+        # 邮件只序列化一次，之后每个收件人只需拼接To头
+        message = self.build_message(subject, html_body)
+
+        # 当前块中地址到收件人的映射，供个性化渲染使用
+        current = {}
+
+        def render(batch):
+            if personalize is not None:
+                recipient = current[batch[0]]
+                personal_message = self.build_message(
+                    subject, render_email_html(personalize(recipient))
+                )
+                return self.address_message(recipient.email, personal_message)
+            if len(batch) == 1:
+                return self.address_message(batch[0], message)
+            return self.address_message(UNDISCLOSED_RECIPIENTS, message)
+
+        # 连接SMTP服务器并发送邮件
+        owns_pool = pool is None
         try:
-            # 简化连接方式，统一处理SSL和非SSL连接
-            if self.use_ssl:
-                server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port)
-                self.logger.info("使用SSL连接SMTP服务器成功，正在进行身份验证...")
-            else:
-                server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-                server.starttls()  # 启用TLS加密
-                self.logger.info("使用TLS连接SMTP服务器成功，正在进行身份验证...")
+            if owns_pool:
+                # 先建立一个连接，确认服务器地址和账号可用
+                pool = self.open_pool()
+            self.logger.info("开始发送邮件...")
 
-            # 登录
-            server.login(self.username, self.password)
-            self.logger.info("身份验证成功，开始发送邮件...")
-
-            # 发送邮件给所有收件人
-            for recipient in recipients:
-                msg["To"] = recipient
-                try:
-                    server.sendmail(self.username, recipient, msg.as_string())
-                    self.logger.info(f"邮件已成功发送至 {recipient}")
-                except smtplib.SMTPException as se:
-                    self.logger.error(f"发送邮件至 {recipient} 时出错：{str(se)}")
-                    raise
+            # 将收件人分配到多个连接并发发送
+            limiter = AdaptiveRateLimiter(self.rate_limit) if self.rate_limit else None
+            engine = DeliveryEngine(
+                pool,
+                # 个性化邮件每人内容不同，只能逐个投递
+                1 if personalize is not None else self.rcpt_per_message,
+                self.logger,
+                limiter=limiter,
+                max_retries=self.max_retries,
+            )
+            # 按块读取并去重收件人，内存占用与收件人总数无关
+            result = DeliveryResult(journal.record if journal is not None else None)
+            skipped = 0
+            for chunk in chunked(dedupe(iter_recipients(recipients)), self.chunk_size):
+                current = {recipient.email: recipient for recipient in chunk}
+                emails = list(current)
+                if journal is not None:
+                    # 跳过上次运行中已投递的收件人
+                    pending = [email for email in emails if not journal.is_delivered(email)]
+                    skipped += len(emails) - len(pending)
+                    emails = pending
+                if emails:
+                    engine.deliver(self.username, emails, render, result)
+            if skipped:
+                self.logger.info(f"跳过 {skipped} 个已投递的收件人")
 
-            # 关闭连接
-            server.quit()
+            if result.failed:
+                self.logger.error(
+                    f"邮件发送完成：成功 {result.delivered} 封，"
+                    f"失败 {len(result.failed)} 封"
+                )
+                return False
+            if limiter and limiter.throttled:
+                self.logger.info(
+                    f"服务器限流 {limiter.throttled} 次，"
+                    f"当前发送速率 {limiter.rate:.2f} 封/秒"
+                )
             self.logger.info("所有邮件发送完成")
             return True
 
@@ -143,3 +245,44 @@ class EmailSender:
         except Exception as e:
             self.logger.error(f"发送邮件时发生未知错误：{str(e)}")
             return False
+        finally:
+            # 关闭连接
+            if owns_pool and pool is not None:
+                pool.close()
+
+
+class BackgroundLogin:
+    def __init__(self, email_sender):
+        """在后台连接并登录SMTP服务器，可在流式生成邮件内容的同时进行。
+
+        参数:
+            email_sender (EmailSender): 邮件发送器
+        """
+        self.email_sender = email_sender
+        self._lock = threading.Lock()
+        self._future = None
+
+    def start(self, *args):
+        """开始连接，多次调用只连接一次，可直接作为 on_subject 回调。"""
+        with self._lock:
+            if self._future is None:
+                executor = ThreadPoolExecutor(max_workers=1)
+                self._future = executor.submit(self.email_sender.open_pool)
+                executor.shutdown(wait=False)
+
+    def result(self):
+        """等待连接完成并返回连接池。
+
+        返回:
+            SMTPConnectionPool | None: 已登录的连接池，未开始或连接失败时返回None，
+                由发送阶段重新连接并报告错误
+        """
+        if self._future is None:
+            return None
+        try:
+            return self._future.result()
+        except Exception as e:
+            # 只报告一次，之后视为未开始连接
+            self._future = None
+            self.email_sender.logger.warning(f"提前连接SMTP服务器失败，将在发送时重试：{str(e)}")
+            return None
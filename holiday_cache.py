@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import threading
+import time
+
+from metrics import incr
+
+
+class HolidayCache:
+    def __init__(self, db_path="holiday_cache.db", ttl_days=30):
+        """初始化节假日缓存，使用SQLite按日期持久化API返回结果。
+
+        参数:
+            db_path (str): 缓存数据库文件路径
+            ttl_days (int): 缓存有效天数，超过后重新请求节假日API
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS holiday ("
+            "date TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, date):
+        """读取指定日期的缓存数据。
+
+        参数:
+            date (str): 日期，格式为YYYY-MM-DD
+
+        返回:
+            dict | None: 未过期的API数据，未命中时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, fetched_at FROM holiday WHERE date = ?", (date,)
+            ).fetchone()
+            if row and time.time() - row[1] < self.ttl_seconds:
+                self.hits += 1
+                incr("holiday_cache_hits")
+                return json.loads(row[0])
+            self.misses += 1
+            incr("holiday_cache_misses")
+            return None
+
+    def set(self, date, data):
+        """写入指定日期的API数据。
+
+        参数:
+            date (str): 日期，格式为YYYY-MM-DD
+            data (dict): 节假日API返回的数据
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO holiday (date, data, fetched_at) VALUES (?, ?, ?)",
+                (date, json.dumps(data, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def get_or_fetch(self, date, fetcher):
+        """优先从缓存读取，未命中时调用fetcher获取并写入缓存。
+
+        参数:
+            date (str): 日期，格式为YYYY-MM-DD
+            fetcher (callable): 接收日期并返回API数据的函数，失败时返回None
+
+        返回:
+            dict | None: API数据
+        """
+        data = self.get(date)
+        if data is None:
+            data = fetcher(date)
+            if data is not None:
+                self.set(date, data)
+        return data
+
+    def stats(self):
+        """返回缓存命中统计。
+
+        返回:
+            dict: 包含命中数、未命中数（即网络请求次数）和命中率
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """关闭数据库连接。"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,184 @@
+import json
+import os
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date as date_cls, timedelta
+
+WORKDAY = 0
+WEEKEND = 1
+HOLIDAY = 2
+
+_NOTE_TO_STATUS = {"工作日": WORKDAY, "周末": WEEKEND, "节日": HOLIDAY}
+_STATUS_TO_NOTE = {status: note for note, status in _NOTE_TO_STATUS.items()}
+
+
+def _to_date(value):
+    if isinstance(value, date_cls):
+        return value
+    return date_cls.fromisoformat(value)
+
+
+class YearIndex:
+    def __init__(self, year, status, names, built_at=None):
+        """初始化单个年份的节假日索引。
+
+        参数:
+            year (int): 年份
+            status (bytearray): 每天的状态，下标为当年第几天（从0开始）
+            names (dict): 当年第几天到节日名称的映射
+            built_at (float, 可选): 索引构建时间戳
+        """
+        self.year = year
+        self.status = status
+        self.names = names
+        self.built_at = built_at or time.time()
+        start = date_cls(year, 1, 1).toordinal()
+        self._workdays = [
+            start + day for day, value in enumerate(status) if value == WORKDAY
+        ]
+        self._holidays = [
+            start + day for day, value in enumerate(status) if value == HOLIDAY
+        ]
+
+    @classmethod
+    def from_days(cls, year, days):
+        """根据工具返回格式的日期数据构建索引。
+
+        参数:
+            year (int): 年份
+            days (dict): 日期到工具返回格式数据的映射，需覆盖当年每一天
+
+        返回:
+            YearIndex: 构建好的索引
+        """
+        start = date_cls(year, 1, 1)
+        size = (date_cls(year + 1, 1, 1) - start).days
+        status = bytearray(size)
+        names = {}
+        for offset in range(size):
+            day = days[str(start + timedelta(days=offset))]
+            status[offset] = _NOTE_TO_STATUS[day["note"]]
+            if status[offset] == HOLIDAY:
+                names[offset] = day["holiday_name"]
+        return cls(year, status, names)
+
+    @classmethod
+    def load(cls, path):
+        """从磁盘读取索引文件。"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            data["year"],
+            bytearray(int(value) for value in data["status"]),
+            {int(day): name for day, name in data["names"].items()},
+            data["built_at"],
+        )
+
+    def save(self, path):
+        """将索引写入磁盘，状态以紧凑的数字字符串保存。"""
+        data = {
+            "year": self.year,
+            "built_at": self.built_at,
+            "status": "".join(str(value) for value in self.status),
+            "names": {str(day): name for day, name in self.names.items()},
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class HolidayIndex:
+    def __init__(self, index_dir="holiday_index", max_age_days=30):
+        """初始化按年份预计算的节假日索引。
+
+        参数:
+            index_dir (str): 索引文件所在目录
+            max_age_days (int): 索引有效天数，超过后重新构建
+        """
+        self.index_dir = index_dir
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.years = {}
+
+    def _path(self, year):
+        return os.path.join(self.index_dir, f"{year}.json")
+
+    def ensure_years(self, years, fetch_days):
+        """确保指定年份的索引已加载，缺失或过期时一次性批量预取并构建。
+
+        参数:
+            years (iterable): 年份列表
+            fetch_days (callable): 接收日期列表并返回日期到工具返回格式数据映射的函数
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        for year in sorted(set(years)):
+            index = self.years.get(year)
+            if index is None and os.path.exists(self._path(year)):
+                index = YearIndex.load(self._path(year))
+            if index is None or time.time() - index.built_at >= self.max_age_seconds:
+                start = date_cls(year, 1, 1)
+                size = (date_cls(year + 1, 1, 1) - start).days
+                dates = [str(start + timedelta(days=offset)) for offset in range(size)]
+                index = YearIndex.from_days(year, fetch_days(dates))
+                index.save(self._path(year))
+            self.years[year] = index
+
+    def _year(self, year):
+        if year not in self.years:
+            raise KeyError(f"{year} 年的节假日索引尚未加载")
+        return self.years[year]
+
+    def status(self, date):
+        """返回日期的状态：WORKDAY、WEEKEND或HOLIDAY。"""
+        date = _to_date(date)
+        return self._year(date.year).status[date.timetuple().tm_yday - 1]
+
+    def is_workday(self, date):
+        """判断日期是否为工作日。"""
+        return self.status(date) == WORKDAY
+
+    def holiday_name(self, date):
+        """返回日期对应的节日名称，非节日返回空字符串。"""
+        date = _to_date(date)
+        return self._year(date.year).names.get(date.timetuple().tm_yday - 1, "")
+
+    def day(self, date):
+        """返回与 is_working_date_tool 格式一致的日期数据。"""
+        date = _to_date(date)
+        status = self.status(date)
+        return {
+            "isHoliday": status == HOLIDAY,
+            "note": _STATUS_TO_NOTE[status],
+            "holiday_name": self.holiday_name(date) or _STATUS_TO_NOTE[status],
+            "date": str(date),
+        }
+
+    def _search(self, attr, date, previous):
+        date = _to_date(date)
+        ordinal = date.toordinal()
+        if previous:
+            years = sorted((y for y in self.years if y <= date.year), reverse=True)
+        else:
+            years = sorted(y for y in self.years if y >= date.year)
+        for year in years:
+            values = getattr(self.years[year], attr)
+            if previous:
+                pos = bisect_left(values, ordinal)
+                if pos:
+                    return date_cls.fromordinal(values[pos - 1])
+            else:
+                pos = bisect_right(values, ordinal)
+                if pos < len(values):
+                    return date_cls.fromordinal(values[pos])
+        return None
+
+    def previous_workday(self, date):
+        """返回指定日期之前最近的工作日，已加载的索引中不存在时返回None。"""
+        return self._search("_workdays", date, previous=True)
+
+    def next_holiday(self, date):
+        """返回指定日期之后的第一个节日及其名称，不存在时返回None。"""
+        holiday = self._search("_holidays", date, previous=False)
+        if holiday is None:
+            return None
+        return holiday, self.holiday_name(holiday)
@@ -0,0 +1,364 @@
+"""节日邮件的共用流程：读取配置、获取日程、生成内容和发送邮件。
+
+命令行入口 main.py 以及常驻、批量和流水线模式共用这些函数。
+"""
+
+from datetime import datetime
+import os
+import json
+
+from metrics import get_registry, stage
+from schedule_store import ScheduleStore
+
+# 大模型、HTTP和SMTP相关模块只在需要时导入，不发送邮件的日子可以快速退出
+
+
+def load_config(config_path="config.json"):
+    """从JSON文件加载配置。
+
+    参数:
+        config_path (str): 配置文件路径
+
+    返回:
+        dict: 配置数据
+    """
+    if not os.path.exists(config_path):
+        raise FileNotFoundError(f"找不到配置文件：{config_path}")
+
+    with open(config_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_run_report(config, logger):
+    """写入本次运行各阶段耗时和计数的JSON报告及 Prometheus textfile，开启性能分析时同时写入分析报告。
+
+    参数:
+        config (dict): 配置数据
+        logger (logging.Logger): 日志记录器
+    """
+    metrics_config = config.get("metrics", {})
+    registry = get_registry()
+    try:
+        registry.write(
+            report_path=metrics_config.get("report_path", "run_report.json"),
+            prometheus_path=metrics_config.get("prometheus_path", ""),
+        )
+        if registry.profiler is not None:
+            registry.profiler.write()
+            logger.info(f"性能分析报告已写入：{registry.profiler.path}")
+    except OSError as e:
+        logger.warning(f"写入运行报告失败：{str(e)}")
+
+
+def resolve_openai_settings(config):
+    """从环境变量（包括.env文件）和配置中获取OpenAI设置。
+
+    参数:
+        config (dict): 配置数据
+
+    返回:
+        dict: 包含api_key、base_url、email_model和date_model的字典
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    return {
+        "api_key": os.environ.get("OPENAI_API_KEY")
+        or config["openai"].get("api_key", ""),
+        "base_url": os.environ.get("OPENAI_API_BASE")
+        or config["openai"].get("base_url", ""),
+        "email_model": os.environ.get("OPENAI_API_MODEL")
+        or config["openai"].get("email_model", ""),
+        "date_model": os.environ.get("OPENAI_API_MODEL")
+        or config["openai"].get("date_model", ""),
+    }
+
+
+def resolve_fallback_settings(config, settings):
+    """从配置中获取备用模型设置，未配置备用模型时返回None。
+
+    参数:
+        config (dict): 配置数据
+        settings (dict): resolve_openai_settings 返回的OpenAI设置
+
+    返回:
+        dict | None: 包含base_url、api_key和model的字典
+    """
+    model = os.environ.get("OPENAI_FALLBACK_MODEL") or config["openai"].get(
+        "fallback_model", ""
+    )
+    if not model:
+        return None
+    return {
+        "base_url": config["openai"].get("fallback_base_url") or settings["base_url"],
+        "api_key": config["openai"].get("fallback_api_key") or settings["api_key"],
+        "model": model,
+    }
+
+
+def create_resilience_policy(config):
+    """根据配置创建调用大模型的超时、重试和对冲策略。
+
+    参数:
+        config (dict): 配置数据
+
+    返回:
+        ResiliencePolicy: 容错策略
+    """
+    from resilience import ResiliencePolicy
+
+    resilience = config.get("resilience", {})
+    return ResiliencePolicy(
+        timeout=resilience.get("timeout", 60),
+        retries=resilience.get("retries", 2),
+        backoff=resilience.get("backoff", 1.0),
+        hedge_after=resilience.get("hedge_after"),
+    )
+
+
+def configure_holiday_data(config):
+    """根据配置设置节假日缓存、年度索引和API请求的超时重试。
+
+    参数:
+        config (dict): 配置数据
+    """
+    from date_fetcher import (
+        configure_holiday_cache,
+        configure_holiday_http,
+        configure_holiday_index,
+    )
+
+    configure_holiday_cache(
+        db_path=config["holiday"].get("cache_path", "holiday_cache.db"),
+        ttl_days=config["holiday"].get("cache_ttl_days", 30),
+    )
+    configure_holiday_index(
+        index_dir=config["holiday"].get("index_dir", "holiday_index"),
+        max_age_days=config["holiday"].get("cache_ttl_days", 30),
+    )
+    configure_holiday_http(
+        timeout=config["holiday"].get("http_timeout", 10),
+        retries=config["holiday"].get("http_retries", 2),
+    )
+
+
+def fetch_email_schedule(config, settings, logger):
+    """获取未来的节日并更新邮件发送日程表。
+
+    参数:
+        config (dict): 配置数据
+        settings (dict): resolve_openai_settings 返回的OpenAI设置
+        logger (logging.Logger): 日志记录器
+
+    返回:
+        ScheduleStore: 更新后的日程
+    """
+    from date_fetcher import fetch_schedule
+
+    with stage("fetch_schedule"):
+        cache_stats = fetch_schedule(
+            base_url=settings["base_url"],
+            api_key=settings["api_key"],
+            model=settings["date_model"],
+            apart_day=config["holiday"].get("apart_day", 7),
+            mode=config["holiday"].get("fetch_mode", "scan"),
+            max_concurrency=config["holiday"].get("max_concurrency", 10),
+            fallback=resolve_fallback_settings(config, settings),
+            policy=create_resilience_policy(config),
+        )
+    logger.info(
+        f"节假日缓存命中 {cache_stats['hits']} 次，"
+        f"网络请求 {cache_stats['misses']} 次"
+    )
+    schedule = ScheduleStore()
+    if not schedule:
+        logger.info("没有找到邮件发送日程表...")
+    return schedule
+
+
+def create_content_generator(config, settings):
+    """创建带缓存的邮件内容生成器。
+
+    参数:
+        config (dict): 配置数据
+        settings (dict): resolve_openai_settings 返回的OpenAI设置
+
+    返回:
+        ContentGenerator: 内容生成器
+    """
+    from content_cache import ContentCache
+    from content_generator import ContentGenerator
+
+    content_cache = ContentCache(
+        db_path=config["openai"].get("content_cache_path", "content_cache.db"),
+        max_entries=config["openai"].get("content_cache_max_entries", 64),
+        ttl_days=config["openai"].get("content_cache_ttl_days", 30),
+    )
+    return ContentGenerator(
+        api_key=settings["api_key"],
+        base_url=settings["base_url"],
+        model=settings["email_model"],
+        cache=content_cache,
+        fallback=resolve_fallback_settings(config, settings),
+        policy=create_resilience_policy(config),
+        stream=config["openai"].get("stream", False),
+    )
+
+
+def pregenerate_upcoming(content_generator, schedule, logger):
+    """提前为日程中即将到来的节日生成邮件内容。
+
+    参数:
+        content_generator (ContentGenerator): 内容生成器
+        schedule (ScheduleStore): 邮件发送日程
+        logger (logging.Logger): 日志记录器
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    upcoming = [entry["holiday_name"] for entry in schedule.upcoming(today)]
+    with stage("pregenerate"):
+        pregenerated = content_generator.pregenerate(upcoming)
+    for holiday_name, content in pregenerated.items():
+        logger.info(f"已预生成{holiday_name}的邮件内容：{content['subject']}")
+
+
+def create_email_sender(config):
+    """根据配置创建邮件发送器。
+
+    参数:
+        config (dict): 配置数据
+
+    返回:
+        EmailSender: 邮件发送器
+    """
+    from email_sender import EmailSender
+
+    return EmailSender(
+        smtp_server=config["email"]["smtp_server"],
+        smtp_port=config["email"]["smtp_port"],
+        username=config["email"]["username"],
+        password=config["email"]["password"],
+        sender_name=config["email"]["sender_name"],
+        ssl=config["email"].get("use_ssl", True),
+        max_connections=config["email"].get("max_connections", 4),
+        rcpt_per_message=config["email"].get("rcpt_per_message", 1),
+        rate_limit=config["email"].get("rate_limit", 0),
+        max_retries=config["email"].get("max_retries", 3),
+        chunk_size=config["email"].get("chunk_size", 1000),
+        starttls=config["email"].get("use_starttls", True),
+    )
+
+
+def send_holiday_email(
+    config,
+    content_generator,
+    holiday_name,
+    logger,
+    test=False,
+    email_sender=None,
+    tenant=None,
+    pool=None,
+):
+    """生成并发送某个节日的邮件。
+
+    参数:
+        config (dict): 配置数据
+        content_generator (ContentGenerator): 内容生成器
+        holiday_name (str): 节日名称
+        logger (logging.Logger): 日志记录器
+        test (bool): 测试模式，不实际发送邮件
+        email_sender (EmailSender, 可选): 邮件发送器，为None时根据配置创建
+        tenant (str, 可选): 租户名称，多个配置共用发送日志目录时用于区分
+        pool (SMTPConnectionPool, 可选): 已登录的SMTP连接池，为None时发送时再连接
+
+    返回:
+        bool: 发送成功（或测试模式）返回True，否则返回False
+    """
+    # 流式生成时，收到主题后即在后台连接并登录SMTP服务器
+    login = None
+    if content_generator.stream and not test and pool is None:
+        from email_sender import BackgroundLogin
+
+        email_sender = email_sender or create_email_sender(config)
+        login = BackgroundLogin(email_sender)
+
+    try:
+        # 生成邮件内容
+        with stage("generate_content"):
+            email_content = content_generator.generate_email_content(
+                holiday_name=holiday_name, on_subject=login.start if login else None
+            )
+        logger.info(f"邮件内容已生成：{email_content['subject']}")
+        if login is not None:
+            pool = login.result()
+
+        # 按团队和语言批量生成问候语，再为每个收件人在本地拼接称呼
+        personalizer = None
+        personalization = config.get("personalization", {})
+        if personalization.get("enabled", False):
+            from personalizer import Personalizer, top_variants
+            from recipient_source import iter_recipients
+
+            variants = top_variants(
+                iter_recipients(config["recipients"]),
+                personalization.get("max_variants", 8),
+            )
+            with stage("personalize"):
+                greetings = content_generator.generate_greetings(
+                    holiday_name,
+                    variants,
+                    batch_size=personalization.get("batch_size", 4),
+                )
+            personalizer = Personalizer(greetings)
+            logger.info(f"已生成 {len(greetings)} 个团队问候语")
+
+        if test:
+            logger.info("测试模式：邮件未发送")
+            logger.info(f"邮件主题：{email_content['subject']}")
+            logger.info(f"邮件内容：{email_content['body']}")
+            return True
+
+        from send_journal import SendJournal
+
+        # 初始化邮件发送器
+        email_sender = email_sender or create_email_sender(config)
+
+        # 发送日志按年份和节日区分，中断后重新运行只发送剩余收件人
+        run_key = f"{datetime.now().year}-{holiday_name}"
+        journal = SendJournal(
+            run_key=f"{tenant}-{run_key}" if tenant else run_key,
+            journal_dir=config["email"].get("journal_dir", "send_journal"),
+        )
+
+        # 发送邮件
+        try:
+            with stage("send_email"):
+                success = email_sender.send_email(
+                    recipients=config["recipients"],
+                    subject=email_content["subject"],
+                    body=email_content["body"],
+                    journal=journal,
+                    pool=pool,
+                    personalize=(
+                        (
+                            lambda recipient: personalizer.render_body(
+                                recipient, email_content["body"]
+                            )
+                        )
+                        if personalizer
+                        else None
+                    ),
+                )
+        finally:
+            journal.close()
+
+        if success:
+            logger.info("邮件发送成功")
+        else:
+            logger.error("邮件发送失败")
+        return success
+    finally:
+        # 提前建立的连接池由这里关闭
+        if login is not None:
+            early_pool = login.result()
+            if early_pool is not None:
+                early_pool.close()
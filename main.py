@@ -1,11 +1,22 @@
 from datetime import datetime
-import os
 import argparse
 import logging
 import json
-from content_generator import ContentGenerator
-from date_fetcher import date_fetch_main
-from email_sender import EmailSender
+
+from holiday_mailer import (
+    configure_holiday_data,
+    create_content_generator,
+    fetch_email_schedule,
+    load_config,
+    pregenerate_upcoming,
+    resolve_openai_settings,
+    send_holiday_email,
+    write_run_report,
+)
+from metrics import get_registry, stage
+from schedule_store import ScheduleStore
+
+# 大模型、HTTP和SMTP相关模块只在需要时导入，不发送邮件的日子可以快速退出
 
 
 def setup_logging():
@@ -18,22 +29,6 @@ def setup_logging():
     return logging.getLogger("cn_holiday_email")
 
 
-def load_config(config_path="config.json"):
-    """从JSON文件加载配置。
-
-    参数:
-        config_path (str): 配置文件路径
-
-    返回:
-        dict: 配置数据
-    """
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"找不到配置文件：{config_path}")
-
-    with open(config_path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-
 def create_default_config(config_path="config.json"):
     """创建默认配置文件。
 
@@ -48,15 +43,41 @@ def create_default_config(config_path="config.json"):
             "password": "your_password",
             "sender_name": "公司文化部",
             "use_ssl": True,
+            "max_connections": 4,
+            "rcpt_per_message": 1,
+            "rate_limit": 0,
+            "max_retries": 3,
+            "chunk_size": 1000,
+            "journal_dir": "send_journal",
         },
         "recipients": ["all-employees@company.com", "staff@company.com"],
+        "personalization": {"enabled": False, "max_variants": 8, "batch_size": 4},
         "openai": {
             "api_key": "",  # 可选，或从环境变量中读取
             "base_url": "",  # 可选，从环境变量中读取
             "email_model": "gpt-3.5-turbo",  # 可选，从环境变量中读取
             "date_model": "Qwen/Qwen3-Coder-30B-A3B-Instruct",  # 可选，从环境变量中读取
+            "content_cache_path": "content_cache.db",
+            "content_cache_max_entries": 64,
+            "content_cache_ttl_days": 30,
+            "stream": False,  # 可选，流式接收邮件内容，收到主题后即开始连接SMTP服务器
+            "fallback_model": "",  # 可选，主模型多次失败后使用的备用模型
+            "fallback_base_url": "",  # 可选，默认与主模型相同
+            "fallback_api_key": "",  # 可选，默认与主模型相同
+        },
+        "resilience": {"timeout": 60, "retries": 2, "backoff": 1.0, "hedge_after": None},
+        "metrics": {"report_path": "run_report.json", "prometheus_path": ""},
+        "daemon": {"fetch_time": "08:00", "generate_time": "08:30", "send_time": "09:00"},
+        "holiday": {
+            "apart_day": 7,
+            "fetch_mode": "scan",
+            "max_concurrency": 10,
+            "cache_path": "holiday_cache.db",
+            "cache_ttl_days": 30,
+            "index_dir": "holiday_index",
+            "http_timeout": 10,
+            "http_retries": 2,
         },
-        "holiday": {"apart_day": 7},
     }
 
     with open(config_path, "w", encoding="utf-8") as f:
@@ -76,6 +97,32 @@ def main():
         "--force", action="store_true", help="强制发送邮件，即使今天不是特殊日期"
     )
     parser.add_argument("--test", action="store_true", help="测试模式，不实际发送邮件")
+    parser.add_argument(
+        "--daemon", action="store_true", help="常驻运行，按配置的时间自动获取日程和发送邮件"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="使用异步流水线，获取日程、生成内容和连接SMTP服务器同时进行",
+    )
+    parser.add_argument(
+        "--configs",
+        nargs="+",
+        help="批量运行多个配置文件（或包含配置文件的目录），共享节假日数据和邮件内容",
+    )
+    parser.add_argument(
+        "--max-tenants", type=int, default=4, help="批量运行时同时发送邮件的配置数"
+    )
+    parser.add_argument(
+        "--max-connections", type=int, default=16, help="批量运行时全局最大SMTP连接数"
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile_report.txt",
+        metavar="PATH",
+        help="分析各阶段的CPU耗时和内存分配，报告写入指定文件（默认为profile_report.txt）",
+    )
     args = parser.parse_args()
 
     # 如果请求创建默认配置
@@ -87,112 +134,100 @@ def main():
     logger = setup_logging()
     logger.info("启动AI节日邮件发送程序")
 
+    if args.profile:
+        from profiler import StageProfiler
+
+        get_registry().profiler = StageProfiler(path=args.profile)
+
+    # 今天需要运行时才写入运行报告，空闲日不覆盖上一次的报告
+    report_config = None
     try:
+        if args.daemon:
+            from scheduler import HolidayDaemon
+
+            HolidayDaemon(args.config, logger, test=args.test).run()
+            return
+
+        if args.configs:
+            from batch_runner import run_batch
+
+            run_batch(
+                args.configs,
+                logger,
+                test=args.test,
+                max_tenants=args.max_tenants,
+                max_connections=args.max_connections,
+            )
+            return
+
         # 加载配置
-        config = load_config(args.config)
+        with stage("config_load"):
+            config = load_config(args.config)
         logger.info("配置加载成功")
 
-        # 从配置和环境变量获取OpenAI设置
-        api_key = os.environ.get("OPENAI_API_KEY") or config["openai"].get(
-            "api_key", ""
-        )
-        base_url = os.environ.get("OPENAI_API_BASE") or config["openai"].get(
-            "base_url", ""
-        )
-        email_model = os.environ.get("OPENAI_API_MODEL") or config["openai"].get(
-            "email_model", ""
-        )
-        date_model = os.environ.get("OPENAI_API_MODEL") or config["openai"].get(
-            "date_model", ""
+        # 先判断今天是否需要获取日程或发送邮件，都不需要时直接退出
+        today = datetime.now().strftime("%Y-%m-%d")
+        # 与 date_fetcher.is_run 相同，这里直接判断以免导入 date_fetcher
+        fetch_today = datetime.now().weekday() == config["holiday"].get(
+            "date_fetch_weekday", 6
         )
+        schedule = ScheduleStore()
+        if not (fetch_today or args.force or schedule.due_on(today)):
+            logger.info("今天不是特殊日期，不发送邮件。")
+            return
+        report_config = config
 
-        # 从配置获取节假日设置
-        date_fetch_weekday = config["holiday"].get("date_fetch_weekday", 6)
-        apart_day = config["holiday"].get("apart_day", 7)
+        settings = resolve_openai_settings(config)
+        configure_holiday_data(config)
 
-        if not all([api_key, base_url, email_model, date_model]):
+        if not all(settings.values()):
             logger.error("缺少必要的 OpenAI 设置，请检查配置文件或环境变量。")
             return
 
-        # 请求节假日数据
-        date_fetch_main(
-            base_url=base_url,
-            api_key=api_key,
-            model=date_model,
-            apart_day=apart_day,
-            date_fetch_weekday=date_fetch_weekday,
-        )
+        if args.pipeline and not args.force:
+            import asyncio
+
+            from pipeline import run_pipeline
+
+            asyncio.run(
+                run_pipeline(config, settings, logger, fetch_today, test=args.test)
+            )
+            return
 
         # 初始化组件
-        content_generator = ContentGenerator(
-            api_key=api_key, base_url=base_url, model=email_model
-        )
+        content_generator = create_content_generator(config, settings)
 
-        # 检查今天是否应该发送邮件
-        if os.path.exists("date.json"):
-            with open("date.json") as f:
-                email_schedule = json.load(f)
-                if email_schedule[0]:
-                    date_info = email_schedule[0]
-                else:
-                    date_info = {}
-        else:
-            logger.info("没有找到邮件发送日程表...")
-            date_info = {}
-
-        should_send = (
-            True
-            if date_info.get("nearest_workday", "")
-            == datetime.now().strftime("%Y-%m-%d")
-            else False
-        )
+        if fetch_today:
+            # 请求节假日数据，并提前为即将到来的节日生成邮件内容
+            schedule = fetch_email_schedule(config, settings, logger)
+            pregenerate_upcoming(content_generator, schedule, logger)
+
+        # 今天可能有多个节日需要发送
+        holiday_names = [entry["holiday_name"] for entry in schedule.due_on(today)]
 
-        if should_send or args.force:
+        if holiday_names or args.force:
             # 如果强制发送但今天不是特殊日期，则查找最近的特殊日期
             if args.force:
                 logger.info("强制发送模式：查找最近的特殊日期")
-                holiday_name = input("请输入节日名称: ")
-            else:
-                holiday_name = date_info["holiday_name"]
-                logger.info(f"今天将提前发送{holiday_name}的邮件")
+                holiday_names = [input("请输入节日名称: ")]
 
-            # 生成邮件内容
-            email_content = content_generator.generate_email_content(
-                holiday_name=holiday_name
-            )
-            logger.info(f"邮件内容已生成：{email_content['subject']}")
-
-            if not args.test:
-                # 初始化邮件发送器
-                email_sender = EmailSender(
-                    smtp_server=config["email"]["smtp_server"],
-                    smtp_port=config["email"]["smtp_port"],
-                    username=config["email"]["username"],
-                    password=config["email"]["password"],
-                    sender_name=config["email"]["sender_name"],
-                    ssl=config["email"].get("use_ssl", True),
-                )
-
-                # 发送邮件
-                success = email_sender.send_email(
-                    recipients=config["recipients"],
-                    subject=email_content["subject"],
-                    body=email_content["body"],
-                )
-
-                if success:
-                    logger.info("邮件发送成功")
-                else:
-                    logger.error("邮件发送失败")
-            else:
-                logger.info("测试模式：邮件未发送")
-                logger.info(f"邮件主题：{email_content['subject']}")
-                logger.info(f"邮件内容：{email_content['body']}")
+            # 一个节日发送失败不影响其他节日的发送
+            for holiday_name in holiday_names:
+                logger.info(f"今天将提前发送{holiday_name}的邮件")
+                try:
+                    send_holiday_email(
+                        config, content_generator, holiday_name, logger, test=args.test
+                    )
+                except Exception as e:
+                    logger.exception(f"发送{holiday_name}的邮件时发生错误：{str(e)}")
         else:
             logger.info("今天不是特殊日期，不发送邮件。")
 
     except Exception as e:
         logger.exception(f"发生错误：{str(e)}")
+    finally:
+        if report_config is not None:
+            write_run_report(report_config, logger)
 
 
 if __name__ == "__main__":
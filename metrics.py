@@ -0,0 +1,205 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "cn_holiday_email"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """初始化本次运行的指标记录，包括各阶段耗时和计数器。"""
+        self._lock = threading.Lock()
+        # 设置为 StageProfiler 时，同时分析各阶段的CPU耗时和内存分配
+        self.profiler = None
+        self.reset()
+
+    def reset(self):
+        """清空已记录的指标，常驻模式下每次运行前调用。"""
+        with self._lock:
+            self.started_at = time.time()
+            self._stages = {}
+            self._counters = {}
+        if self.profiler is not None:
+            self.profiler.reset()
+
+    @contextmanager
+    def stage(self, name):
+        """记录一段代码的耗时，出错时同样记录。
+
+        参数:
+            name (str): 阶段名称
+        """
+        token = self.profiler.start(name) if self.profiler is not None else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+            if token is not None:
+                self.profiler.stop(token)
+
+    def observe(self, name, seconds):
+        """记录某个阶段的一次耗时。
+
+        参数:
+            name (str): 阶段名称
+            seconds (float): 耗时（秒）
+        """
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                self._stages[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def incr(self, name, value=1):
+        """增加计数器的值。
+
+        参数:
+            name (str): 计数器名称
+            value (int): 增加的值
+        """
+        if not value:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def report(self):
+        """返回本次运行的指标报告。
+
+        返回:
+            dict: 包含开始时间、总耗时、各阶段耗时统计和计数器
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "mean_seconds": round(total / count, 6),
+                    "max_seconds": round(maximum, 6),
+                }
+                for name, (count, total, maximum) in sorted(self._stages.items())
+            }
+            counters = dict(sorted(self._counters.items()))
+        return {
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(
+                timespec="seconds"
+            ),
+            "duration_seconds": round(time.time() - self.started_at, 6),
+            "stages": stages,
+            "counters": counters,
+        }
+
+    def prometheus(self):
+        """返回 Prometheus textfile 格式的指标。
+
+        返回:
+            str: 指标文本
+        """
+        report = self.report()
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds 各阶段耗时",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+        ]
+        for name, stats in report["stages"].items():
+            lines.append(
+                f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{name}"}} {stats["total_seconds"]}'
+            )
+            lines.append(
+                f'{METRIC_PREFIX}_stage_seconds_count{{stage="{name}"}} {stats["count"]}'
+            )
+        lines += [
+            f"# HELP {METRIC_PREFIX}_stage_max_seconds 各阶段单次最大耗时",
+            f"# TYPE {METRIC_PREFIX}_stage_max_seconds gauge",
+        ]
+        for name, stats in report["stages"].items():
+            lines.append(
+                f'{METRIC_PREFIX}_stage_max_seconds{{stage="{name}"}} {stats["max_seconds"]}'
+            )
+        lines += [
+            f"# HELP {METRIC_PREFIX}_events_total 本次运行的事件计数",
+            f"# TYPE {METRIC_PREFIX}_events_total counter",
+        ]
+        for name, value in report["counters"].items():
+            lines.append(f'{METRIC_PREFIX}_events_total{{name="{name}"}} {value}')
+        lines += [
+            f"# HELP {METRIC_PREFIX}_run_duration_seconds 本次运行的总耗时",
+            f"# TYPE {METRIC_PREFIX}_run_duration_seconds gauge",
+            f"{METRIC_PREFIX}_run_duration_seconds {report['duration_seconds']}",
+            f"# HELP {METRIC_PREFIX}_last_run_timestamp_seconds 本次运行的开始时间",
+            f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge",
+            f"{METRIC_PREFIX}_last_run_timestamp_seconds {round(self.started_at, 3)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, report_path=None, prometheus_path=None):
+        """原子地写入JSON运行报告和 Prometheus textfile，路径为空时跳过。
+
+        参数:
+            report_path (str, 可选): JSON运行报告路径
+            prometheus_path (str, 可选): Prometheus textfile 路径
+        """
+        if report_path:
+            _write_atomic(
+                report_path, json.dumps(self.report(), ensure_ascii=False, indent=2)
+            )
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.prometheus())
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# 进程内共用的指标记录，各模块通过下面的函数记录指标
+_registry = MetricsRegistry()
+
+
+def get_registry():
+    """返回进程内共用的指标记录。"""
+    return _registry
+
+
+def stage(name):
+    """记录一段代码的耗时，用法为 ``with stage("name"):``。"""
+    return _registry.stage(name)
+
+
+def observe(name, seconds):
+    """记录某个阶段的一次耗时。"""
+    _registry.observe(name, seconds)
+
+
+def incr(name, value=1):
+    """增加计数器的值。"""
+    _registry.incr(name, value)
+
+
+def record_token_usage(usage):
+    """记录大模型调用的token用量。
+
+    参数:
+        usage (dict | None): Agent运行结果中的用量统计，值为数字或每次请求的数字列表
+    """
+    for key in ("input_tokens", "output_tokens", "total_tokens"):
+        value = (usage or {}).get(key)
+        if isinstance(value, list):
+            value = sum(v for v in value if v)
+        if value:
+            incr(f"llm_{key}", value)
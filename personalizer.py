@@ -0,0 +1,74 @@
+from collections import Counter
+
+
+def variant_key(recipient):
+    """返回收件人对应的问候语组合：(团队, 语言)。"""
+    return recipient.team, recipient.locale
+
+
+def top_variants(recipients, max_variants):
+    """统计收件人中最常见的团队/语言组合。
+
+    只保存组合计数，不保留收件人本身，适用于流式收件人来源。
+
+    参数:
+        recipients (iterable): Recipient 迭代器
+        max_variants (int): 最多返回的组合数，即生成问候语的预算
+
+    返回:
+        list: 按人数从多到少排列的 (团队, 语言) 列表
+    """
+    counts = Counter(variant_key(recipient) for recipient in recipients)
+    return [variant for variant, _ in counts.most_common(max_variants)]
+
+
+class Personalizer:
+    def __init__(self, greetings):
+        """初始化个性化正文生成器。
+
+        参数:
+            greetings (dict): (团队, 语言) 到问候语的映射，未包含的组合不添加问候语
+        """
+        self.greetings = greetings
+
+    @staticmethod
+    def is_english(recipient):
+        """返回收件人是否使用英文。"""
+        return recipient.locale.lower().startswith("en")
+
+    @classmethod
+    def salutation(cls, recipient):
+        """根据收件人姓名和语言生成称呼，没有姓名时返回空字符串。"""
+        if not recipient.name:
+            return ""
+        if cls.is_english(recipient):
+            return f"Dear {recipient.name},"
+        return f"亲爱的{recipient.name}："
+
+    def render_body(self, recipient, body):
+        """为收件人替换正文中的称呼，并在称呼后加上所在团队的问候语。
+
+        通用正文以“亲爱的同事们，”和“Dear team,”开头，替换其中与收件人语言相同的称呼，
+        避免出现两个称呼；收件人没有姓名时保留原称呼。正文中没有称呼时加在正文前。
+
+        参数:
+            recipient (Recipient): 收件人
+            body (str): 通用邮件正文
+
+        返回:
+            str: 个性化后的正文
+        """
+        greeting = self.greetings.get(variant_key(recipient), "")
+        prefix = "Dear" if self.is_english(recipient) else "亲爱的"
+        lines = body.split("\n")
+        for index, line in enumerate(lines):
+            if line.strip().startswith(prefix):
+                salutation = self.salutation(recipient) or line
+                lines[index : index + 1] = [
+                    part for part in (salutation, greeting) if part
+                ]
+                return "\n".join(lines)
+        header = "\n".join(
+            part for part in (self.salutation(recipient), greeting) if part
+        )
+        return f"{header}\n\n{body}" if header else body
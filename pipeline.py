@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime
+
+from holiday_mailer import (
+    create_content_generator,
+    create_email_sender,
+    fetch_email_schedule,
+    pregenerate_upcoming,
+    send_holiday_email,
+)
+from schedule_store import ScheduleStore
+
+
+async def _open_pool(email_sender, logger):
+    """提前连接并登录SMTP服务器，失败时返回None，由发送阶段重新连接并报告错误。"""
+    try:
+        return await asyncio.to_thread(email_sender.open_pool)
+    except Exception as e:
+        logger.warning(f"提前连接SMTP服务器失败，将在发送时重试：{str(e)}")
+        return None
+
+
+async def run_pipeline(config, settings, logger, fetch_today, test=False):
+    """以异步流水线运行一次完整流程，行为与顺序执行相同。
+
+    相互独立的阶段会同时进行：获取日程的同时连接并登录SMTP服务器，
+    多个节日的邮件内容并发生成，每个节日的内容生成后立即开始发送。
+
+    参数:
+        config (dict): 配置数据
+        settings (dict): resolve_openai_settings 返回的OpenAI设置
+        logger (logging.Logger): 日志记录器
+        fetch_today (bool): 今天是否需要获取日程
+        test (bool): 测试模式，不实际发送邮件
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    schedule = ScheduleStore()
+    content_generator = create_content_generator(config, settings)
+    email_sender = None if test else create_email_sender(config)
+
+    # 已知今天要发送时，获取日程期间先建立SMTP连接
+    pool_task = None
+    if email_sender and schedule.due_on(today):
+        pool_task = asyncio.create_task(_open_pool(email_sender, logger))
+
+    if fetch_today:
+        schedule = await asyncio.to_thread(
+            fetch_email_schedule, config, settings, logger
+        )
+    holiday_names = [entry["holiday_name"] for entry in schedule.due_on(today)]
+    if email_sender and holiday_names and pool_task is None:
+        pool_task = asyncio.create_task(_open_pool(email_sender, logger))
+
+    # 即将到来节日的预生成在后台进行，不阻塞今天的发送
+    pregenerate_task = None
+    if fetch_today:
+        pregenerate_task = asyncio.create_task(
+            asyncio.to_thread(pregenerate_upcoming, content_generator, schedule, logger)
+        )
+
+    async def deliver(holiday_name):
+        # 先生成内容（写入缓存），再等待SMTP连接就绪后发送；
+        # 一个节日出错不影响其他节日的发送
+        try:
+            await asyncio.to_thread(
+                content_generator.generate_email_content, holiday_name
+            )
+            pool = await pool_task if pool_task else None
+            logger.info(f"今天将提前发送{holiday_name}的邮件")
+            return await asyncio.to_thread(
+                send_holiday_email,
+                config,
+                content_generator,
+                holiday_name,
+                logger,
+                test=test,
+                email_sender=email_sender,
+                pool=pool,
+            )
+        except Exception as e:
+            logger.exception(f"发送{holiday_name}的邮件时发生错误：{str(e)}")
+            return False
+
+    try:
+        if holiday_names:
+            # 等待所有节日发送结束后才关闭连接池，避免仍在使用的连接归还到已关闭的池中
+            await asyncio.gather(
+                *(deliver(name) for name in holiday_names), return_exceptions=True
+            )
+        else:
+            logger.info("今天不是特殊日期，不发送邮件。")
+        if pregenerate_task:
+            await pregenerate_task
+    finally:
+        if pool_task:
+            pool = await pool_task
+            if pool is not None:
+                pool.close()
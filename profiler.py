@@ -0,0 +1,210 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# 统计内存分配时忽略的模块：分析器自身和模块导入
+_IGNORED_FILES = (
+    tracemalloc.__file__,
+    __file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+)
+
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _function_key(code):
+    return f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})"
+
+
+class _StackSampler:
+    def __init__(self, interval):
+        """定时采样所有线程的调用栈，统计各函数的自身耗时和累计耗时。
+
+        Python 3.12 起 cProfile 会记录其他线程的事件但没有其调用栈，工作线程（如并发投递
+        邮件的线程）中的函数无法正确归属，因此另外对所有线程采样。
+
+        参数:
+            interval (float): 采样间隔（秒）
+        """
+        self.interval = interval
+        self.self_seconds = Counter()
+        self.cumulative_seconds = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self.self_seconds[_function_key(frame.f_code)] += elapsed
+                seen = set()
+                while frame is not None:
+                    key = _function_key(frame.f_code)
+                    if key not in seen:
+                        seen.add(key)
+                        self.cumulative_seconds[key] += elapsed
+                    frame = frame.f_back
+
+
+class StageProfiler:
+    def __init__(self, path="profile_report.txt", top=20, sample_interval=0.005):
+        """初始化按阶段统计CPU耗时和内存分配的分析器。
+
+        由 metrics.stage 在阶段开始和结束时调用。cProfile 同一时间只能有一个在运行，
+        因此只分析最外层的阶段：某个阶段正在分析时开始的其他阶段（包括其他线程中的阶段）
+        计入正在分析的阶段。阶段期间同时对所有线程的调用栈采样，用于找出工作线程中的热点。
+
+        参数:
+            path (str): 报告文件路径
+            top (int): 每个阶段列出的函数和内存分配位置数量
+            sample_interval (float): 线程调用栈的采样间隔（秒）
+        """
+        self.path = path
+        self.top = top
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._active = False
+        self.reset()
+
+    def reset(self):
+        """清空已记录的分析结果。"""
+        self._stages = {}
+
+    def start(self, name):
+        """开始分析一个阶段，已有阶段正在分析时返回None。
+
+        参数:
+            name (str): 阶段名称
+
+        返回:
+            tuple | None: 传给 stop 的标记
+        """
+        with self._lock:
+            if self._active:
+                return None
+            self._active = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        sampler = _StackSampler(self.sample_interval)
+        sampler.start()
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        return name, profile, sampler, before, start
+
+    def stop(self, token):
+        """结束分析并汇总到同名阶段。
+
+        参数:
+            token (tuple | None): start 返回的标记
+        """
+        if token is None:
+            return
+        name, profile, sampler, before, start = token
+        profile.disable()
+        seconds = time.perf_counter() - start
+        sampler.stop()
+        peak = tracemalloc.get_traced_memory()[1]
+        after = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, filename) for filename in _IGNORED_FILES]
+        diff = after.filter_traces(filters).compare_to(
+            before.filter_traces(filters), "lineno"
+        )
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {
+                    "runs": 0,
+                    "seconds": 0.0,
+                    "peak": 0,
+                    "stats": pstats.Stats(profile),
+                    "size": Counter(),
+                    "count": Counter(),
+                    "sampled_self": Counter(),
+                    "sampled_cumulative": Counter(),
+                }
+            else:
+                stage["stats"].add(profile)
+            stage["runs"] += 1
+            stage["seconds"] += seconds
+            stage["peak"] = max(stage["peak"], peak)
+            stage["sampled_self"].update(sampler.self_seconds)
+            stage["sampled_cumulative"].update(sampler.cumulative_seconds)
+            for stat in diff:
+                if stat.size_diff > 0:
+                    location = str(stat.traceback[0])
+                    stage["size"][location] += stat.size_diff
+                    stage["count"][location] += stat.count_diff
+            self._active = False
+
+    def report(self):
+        """返回各阶段的分析报告。
+
+        返回:
+            str: 报告文本，每个阶段列出累计耗时和自身耗时最多的函数以及新增内存最多的位置
+        """
+        sections = [
+            "说明：阶段内有多个线程时，函数的累计耗时为所有线程之和，可能超过阶段耗时。\n"
+            "Python 3.12 起 cProfile 无法正确归属其他线程（如并发投递邮件的线程）中的函数，"
+            "这些函数以“线程采样”部分为准；采样耗时为各线程停留在该函数中的时间之和，"
+            "包括等待锁和网络的时间。"
+        ]
+        with self._lock:
+            stages = list(self._stages.items())
+        for name, stage in stages:
+            lines = [
+                f"== {name}（{stage['runs']} 次，共 {stage['seconds']:.3f} 秒，"
+                f"内存峰值 {_format_size(stage['peak'])}）=="
+            ]
+            for sort_key, title in (("cumulative", "累计耗时"), ("tottime", "自身耗时")):
+                stream = io.StringIO()
+                stats = stage["stats"]
+                stats.stream = stream
+                stats.strip_dirs().sort_stats(sort_key).print_stats(self.top)
+                lines.append(f"-- CPU：{title}最多的 {self.top} 个函数 --")
+                lines.append(stream.getvalue().strip())
+            for key, title in (("sampled_cumulative", "累计耗时"), ("sampled_self", "自身耗时")):
+                lines.append(f"-- 线程采样：{title}最多的 {self.top} 个函数（所有线程）--")
+                for function, sampled in stage[key].most_common(self.top):
+                    lines.append(f"  {sampled:9.3f} 秒  {function}")
+            lines.append(f"-- 内存：新增分配最多的 {self.top} 个位置 --")
+            for location, size in stage["size"].most_common(self.top):
+                lines.append(
+                    f"  {location}: +{_format_size(size)}（+{stage['count'][location]} 个对象）"
+                )
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections) + "\n"
+
+    def write(self):
+        """将报告写入文件。"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(self.report())
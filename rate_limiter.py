@@ -0,0 +1,51 @@
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate, burst=None, min_rate=0.1, increase_ratio=0.01):
+        """初始化令牌桶限速器，根据服务器的限流回复自动调整发送速率。
+
+        参数:
+            rate (float): 每秒最多发送的邮件数，同时作为速率上限
+            burst (int, 可选): 令牌桶容量，默认与每秒速率相同
+            min_rate (float): 速率下限
+            increase_ratio (float): 每次成功后速率增加的比例（相对上限）
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst or max(1, int(rate))
+        self.increase = rate * increase_ratio
+        self.tokens = float(self.burst)
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """获取一个令牌，令牌不足时阻塞等待。"""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        """发送成功后逐步恢复速率（加性增）。"""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        """收到服务器限流回复后降低速率（乘性减），并清空令牌桶。"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.throttled += 1
@@ -0,0 +1,105 @@
+import csv
+import hashlib
+import json
+import logging
+from itertools import islice
+from typing import NamedTuple
+
+logger = logging.getLogger("RecipientSource")
+
+
+class Recipient(NamedTuple):
+    email: str
+    name: str = ""
+    team: str = ""
+    locale: str = ""
+
+
+def _from_record(record):
+    if isinstance(record, Recipient):
+        return record
+    if isinstance(record, str):
+        return Recipient(record.strip())
+    # CSV中列数不足的行，缺少的字段为None
+    return Recipient(
+        email=(record.get("email") or "").strip(),
+        name=record.get("name") or "",
+        team=record.get("team") or "",
+        locale=record.get("locale") or "",
+    )
+
+
+def _iter_file(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            # CSV需要包含email列，可选name、team、locale列
+            reader = csv.DictReader(f)
+            if "email" not in (reader.fieldnames or []):
+                raise ValueError(f"收件人文件 {path} 缺少 email 列")
+            yield from reader
+        elif path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            # 纯文本文件，每行一个邮箱地址
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def iter_recipients(source):
+    """逐个读取收件人，不会一次性把整个列表载入内存。
+
+    参数:
+        source: 收件人来源，可以是邮箱地址或字典组成的列表/生成器，
+            CSV、NDJSON或纯文本文件路径，或形如 {"path": "..."} 的配置
+
+    返回:
+        iterator: Recipient 迭代器
+    """
+    if isinstance(source, dict):
+        source = source["path"]
+    records = _iter_file(source) if isinstance(source, str) else source
+    for record in records:
+        recipient = _from_record(record)
+        if recipient.email:
+            yield recipient
+        elif not isinstance(record, str):
+            logger.warning(f"忽略没有邮箱地址的收件人：{record}")
+
+
+def dedupe(recipients):
+    """去除重复的收件人，按邮箱地址（不区分大小写）判断。
+
+    只保存每个地址的8字节摘要，内存占用与地址长度无关。
+
+    参数:
+        recipients (iterable): Recipient 迭代器
+
+    返回:
+        iterator: 去重后的 Recipient 迭代器
+    """
+    seen = set()
+    for recipient in recipients:
+        digest = int.from_bytes(
+            hashlib.blake2b(recipient.email.lower().encode("utf-8"), digest_size=8).digest()
+        )
+        if digest not in seen:
+            seen.add(digest)
+            yield recipient
+
+
+def chunked(iterable, size):
+    """将迭代器按固定大小分块。
+
+    参数:
+        iterable (iterable): 任意迭代器
+        size (int): 每块的大小
+
+    返回:
+        iterator: 每次返回一个列表
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,84 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+
+def backoff_delay(attempt, base):
+    """返回第 attempt 次重试前的等待秒数（指数退避加随机抖动）。"""
+    delay = base * 2 ** (attempt - 1)
+    return delay + random.uniform(0, delay)
+
+
+def _spawn(func):
+    """在守护线程中执行函数并返回 Future，超时放弃的调用不会阻止进程退出。"""
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+class ResiliencePolicy:
+    def __init__(self, timeout=60, retries=2, backoff=1.0, hedge_after=None):
+        """初始化外部调用的容错策略。
+
+        参数:
+            timeout (float): 单次调用的截止时间（秒）
+            retries (int): 每个端点失败后的重试次数
+            backoff (float): 首次重试前等待的秒数，之后按指数增长并加入随机抖动
+            hedge_after (float, 可选): 调用超过该秒数仍未返回时，再发起一个相同的请求，
+                取先返回的结果；为None时不发起对冲请求
+        """
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+
+    def _call_once(self, func):
+        deadline = time.monotonic() + self.timeout
+        pending = {_spawn(func)}
+        hedged = self.hedge_after is None or self.hedge_after >= self.timeout
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            wait_for = remaining if hedged else min(remaining, self.hedge_after)
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+            if not hedged and pending:
+                # 首个请求超过 hedge_after 仍未返回时发起对冲请求
+                hedged = True
+                pending.add(_spawn(func))
+        raise error or TimeoutError(f"调用超过 {self.timeout} 秒未返回")
+
+    def call(self, *endpoints):
+        """按顺序调用各端点，每个端点都有截止时间和重试，全部失败时抛出最后一个错误。
+
+        参数:
+            endpoints (callable): 主端点和备用端点，均为无参数函数
+
+        返回:
+            第一个成功调用的返回值
+        """
+        error = None
+        for func in endpoints:
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    time.sleep(backoff_delay(attempt, self.backoff))
+                try:
+                    return self._call_once(func)
+                except Exception as e:
+                    error = e
+        raise error
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import tempfile
+from bisect import bisect_left, bisect_right
+from datetime import date as date_cls
+
+logger = logging.getLogger("ScheduleStore")
+
+
+def validate_entry(entry):
+    """校验并规范化单条日程。
+
+    参数:
+        entry (dict): 日程，需包含 holiday_name 和 nearest_workday（YYYY-MM-DD）
+
+    返回:
+        dict | None: 规范化后的日程，无效时返回None
+    """
+    if not isinstance(entry, dict):
+        return None
+    holiday_name = entry.get("holiday_name")
+    nearest_workday = entry.get("nearest_workday")
+    if not isinstance(holiday_name, str) or not holiday_name.strip():
+        return None
+    try:
+        nearest_workday = str(date_cls.fromisoformat(str(nearest_workday)))
+    except ValueError:
+        return None
+    return {
+        "isHoliday": bool(entry.get("isHoliday", True)),
+        "holiday_name": holiday_name.strip(),
+        "nearest_workday": nearest_workday,
+    }
+
+
+def parse_schedule(text):
+    """解析日程文本，兼容大模型输出的代码块和单个对象。
+
+    参数:
+        text (str): JSON文本
+
+    返回:
+        list: 校验通过的日程列表
+
+    异常:
+        ValueError: 文本不是有效的JSON
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    data = json.loads(text) if text.strip() else []
+    if isinstance(data, dict):
+        data = [data] if data else []
+    if not isinstance(data, list):
+        raise ValueError("日程必须是JSON数组或对象")
+    entries = []
+    for item in data:
+        entry = validate_entry(item)
+        if entry is None:
+            logger.warning(f"忽略无效的日程：{item}")
+        else:
+            entries.append(entry)
+    return entries
+
+
+class ScheduleStore:
+    def __init__(self, path="date.json"):
+        """初始化邮件发送日程存储，按发送日期排序并支持二分查找。
+
+        参数:
+            path (str): 日程文件路径
+        """
+        self.path = path
+        self.entries = []
+        self._dates = []
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._set(parse_schedule(f.read()))
+            except (OSError, ValueError) as e:
+                logger.error(f"日程文件 {path} 无法读取，已忽略：{str(e)}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _set(self, entries):
+        self.entries = sorted(
+            entries, key=lambda entry: (entry["nearest_workday"], entry["holiday_name"])
+        )
+        self._dates = [entry["nearest_workday"] for entry in self.entries]
+
+    def due_on(self, date):
+        """返回在指定日期发送的所有日程。
+
+        参数:
+            date (str): 日期，格式为YYYY-MM-DD
+
+        返回:
+            list: 日程列表
+        """
+        return self.entries[bisect_left(self._dates, date) : bisect_right(self._dates, date)]
+
+    def upcoming(self, date):
+        """返回在指定日期及之后发送的所有日程。"""
+        return self.entries[bisect_left(self._dates, date) :]
+
+    def merge(self, entries, today=None, window=None):
+        """合并新的日程，去除重复项和已过期的日程。
+
+        参数:
+            entries (list): 新的日程列表
+            today (str, 可选): 今天的日期，早于该日期的日程会被删除
+            window (tuple, 可选): 新日程覆盖的发送日期范围 (开始, 结束)，格式为YYYY-MM-DD；
+                原有日程中发送日期在该范围内的全部由新日程替换，避免保留过时或改名的节日
+        """
+        today = today or str(date_cls.today())
+        kept = self.upcoming(today)
+        if window is not None:
+            start, end = window
+            kept = [entry for entry in kept if not start <= entry["nearest_workday"] <= end]
+        merged = {}
+        for entry in kept + [
+            entry for entry in entries if entry["nearest_workday"] >= today
+        ]:
+            merged[(entry["nearest_workday"], entry["holiday_name"])] = entry
+        self._set(list(merged.values()))
+
+    def save(self):
+        """原子地写入日程文件，写入中途出错不会破坏原文件。"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
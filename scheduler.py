@@ -0,0 +1,131 @@
+import sched
+import time
+from datetime import datetime, timedelta
+
+from holiday_mailer import (
+    configure_holiday_data,
+    create_content_generator,
+    create_email_sender,
+    fetch_email_schedule,
+    load_config,
+    pregenerate_upcoming,
+    resolve_openai_settings,
+    send_holiday_email,
+    write_run_report,
+)
+from metrics import get_registry
+from schedule_store import ScheduleStore
+
+
+def next_run_time(at, weekday=None, now=None):
+    """计算下一次运行的时间戳。
+
+    参数:
+        at (str): 运行时间，格式为HH:MM
+        weekday (int, 可选): 只在星期几运行（0为周一），为None时每天运行
+        now (datetime, 可选): 当前时间，默认为现在
+
+    返回:
+        float: 下一次运行的时间戳
+    """
+    now = now or datetime.now()
+    hour, minute = (int(value) for value in at.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    if weekday is not None:
+        run_at += timedelta(days=(weekday - run_at.weekday()) % 7)
+    return run_at.timestamp()
+
+
+class HolidayDaemon:
+    def __init__(self, config_path, logger, test=False):
+        """初始化常驻运行的节日邮件调度器。
+
+        配置、日程表、大模型客户端和邮件发送器只创建一次，在多次运行之间复用。
+
+        参数:
+            config_path (str): 配置文件路径
+            logger (logging.Logger): 日志记录器
+            test (bool): 测试模式，不实际发送邮件
+        """
+        self.logger = logger
+        self.test = test
+        self.config = load_config(config_path)
+        self.settings = resolve_openai_settings(self.config)
+        if not all(self.settings.values()):
+            raise ValueError("缺少必要的 OpenAI 设置，请检查配置文件或环境变量。")
+        configure_holiday_data(self.config)
+
+        daemon_config = self.config.get("daemon", {})
+        self.fetch_time = daemon_config.get("fetch_time", "08:00")
+        self.generate_time = daemon_config.get("generate_time", "08:30")
+        self.send_time = daemon_config.get("send_time", "09:00")
+        self.date_fetch_weekday = self.config["holiday"].get("date_fetch_weekday", 6)
+
+        self.content_generator = create_content_generator(self.config, self.settings)
+        self.email_sender = None if test else create_email_sender(self.config)
+        self.schedule = ScheduleStore()
+        self.scheduler = sched.scheduler(time.time, time.sleep)
+
+    def due_today(self):
+        """返回今天需要发送的节日名称列表。"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        return [entry["holiday_name"] for entry in self.schedule.due_on(today)]
+
+    def fetch(self):
+        """获取日程并预生成即将到来节日的邮件内容。"""
+        self.schedule = fetch_email_schedule(self.config, self.settings, self.logger)
+        pregenerate_upcoming(self.content_generator, self.schedule, self.logger)
+
+    def generate(self):
+        """在发送前生成今天要发送的邮件内容，结果写入内容缓存。"""
+        # 某个节日生成失败时记录警告，发送时会重新生成
+        self.content_generator.pregenerate(self.due_today())
+
+    def send(self):
+        """发送今天到期的节日邮件，一个节日发送失败不影响其他节日的发送。"""
+        for holiday_name in self.due_today():
+            self.logger.info(f"今天将提前发送{holiday_name}的邮件")
+            try:
+                send_holiday_email(
+                    self.config,
+                    self.content_generator,
+                    holiday_name,
+                    self.logger,
+                    test=self.test,
+                    email_sender=self.email_sender,
+                )
+            except Exception as e:
+                self.logger.exception(f"发送{holiday_name}的邮件时发生错误：{str(e)}")
+
+    def _schedule(self, action, at, weekday=None):
+        def run():
+            # 每次运行单独统计，运行结束后写入报告
+            get_registry().reset()
+            try:
+                action()
+            except Exception as e:
+                self.logger.exception(f"执行{action.__name__}时发生错误：{str(e)}")
+            finally:
+                write_run_report(self.config, self.logger)
+            # 无论成功与否都安排下一次运行
+            self._schedule(action, at, weekday)
+
+        run_at = next_run_time(at, weekday)
+        self.scheduler.enterabs(run_at, 0, run)
+        self.logger.info(
+            f"下一次{action.__name__}："
+            f"{datetime.fromtimestamp(run_at).strftime('%Y-%m-%d %H:%M')}"
+        )
+
+    def run(self):
+        """启动调度循环，直到进程退出。"""
+        if not self.schedule:
+            # 没有日程表时先获取一次
+            self.fetch()
+        self._schedule(self.fetch, self.fetch_time, self.date_fetch_weekday)
+        self._schedule(self.generate, self.generate_time)
+        self._schedule(self.send, self.send_time)
+        self.logger.info("常驻模式已启动")
+        self.scheduler.run()
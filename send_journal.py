@@ -0,0 +1,70 @@
+import hashlib
+import os
+import threading
+
+
+def _digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SendJournal:
+    def __init__(self, run_key, journal_dir="send_journal", fsync_every=100):
+        """初始化发送日志，记录某次发送（如某个节日）中已投递的收件人。
+
+        每次发送对应一个只追加的日志文件，中断后重新运行时只读取该文件即可跳过已投递的收件人。
+
+        参数:
+            run_key (str): 发送标识，如 "2025-春节"
+            journal_dir (str): 日志文件所在目录
+            fsync_every (int): 每累计多少条记录同步一次磁盘
+        """
+        os.makedirs(journal_dir, exist_ok=True)
+        self.run_key = run_key
+        self.path = os.path.join(journal_dir, f"{_digest(run_key)}.log")
+        self.fsync_every = fsync_every
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._delivered = set()
+        truncated = False
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="ascii") as f:
+                for line in f:
+                    # 只接受完整的行，忽略崩溃时写了一半的最后一行
+                    if line.endswith("\n"):
+                        self._delivered.add(line[:-1])
+                    else:
+                        truncated = True
+        self._file = open(self.path, "a", encoding="ascii")
+        if truncated:
+            self._file.write("\n")
+
+    def __len__(self):
+        return len(self._delivered)
+
+    def is_delivered(self, email):
+        """判断收件人是否已在本次发送中投递过。"""
+        return _digest(email.lower()) in self._delivered
+
+    def record(self, email):
+        """记录收件人已投递，按批次同步到磁盘。"""
+        key = _digest(email.lower())
+        with self._lock:
+            if key in self._delivered:
+                return
+            self._delivered.add(key)
+            self._file.write(key + "\n")
+            self._pending += 1
+            if self._pending >= self.fsync_every:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        """同步剩余记录并关闭日志文件。"""
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
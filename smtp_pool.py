@@ -0,0 +1,253 @@
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import incr, stage
+
+
+class DeliveryResult:
+    def __init__(self, on_delivered=None):
+        """记录一次投递的结果，成功只计数，失败保留收件人和错误信息。
+
+        参数:
+            on_delivered (callable, 可选): 每个收件人投递成功后调用，参数为收件人地址
+        """
+        self.delivered = 0
+        self.failed = {}
+        self.on_delivered = on_delivered
+        self._lock = threading.Lock()
+
+    def add_delivered(self, recipient):
+        if self.on_delivered:
+            self.on_delivered(recipient)
+        with self._lock:
+            self.delivered += 1
+
+    def add_failed(self, recipient, error):
+        with self._lock:
+            self.failed[recipient] = error
+
+    @property
+    def success(self):
+        """所有收件人都投递成功时返回True。"""
+        return not self.failed
+
+
+class SMTPConnectionPool:
+    def __init__(self, connect, max_connections=4):
+        """初始化SMTP连接池，连接按需创建并复用。
+
+        参数:
+            connect (callable): 创建并登录SMTP连接的函数
+            max_connections (int): 最大连接数
+        """
+        self.connect = connect
+        self.max_connections = max_connections
+        self._idle = []
+        self._created = 0
+        # 归还、丢弃或创建失败时都会唤醒等待连接的线程
+        self._available = threading.Condition()
+
+    def acquire(self):
+        """获取一个已登录的连接，连接数已满时等待其他线程归还或丢弃连接。"""
+        with self._available:
+            while not self._idle and self._created >= self.max_connections:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self.connect()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _free_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def release(self, server):
+        """归还连接以便复用。"""
+        with self._available:
+            self._idle.append(server)
+            self._available.notify()
+
+    def discard(self, server):
+        """关闭出错的连接，之后会按需重新创建。"""
+        self._free_slot()
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """关闭所有空闲连接。"""
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._available.notify_all()
+        for server in idle:
+            try:
+                server.quit()
+            except smtplib.SMTPException:
+                server.close()
+
+
+def _is_temporary(code):
+    """判断SMTP回复码是否为可重试的临时错误（4xx）。"""
+    return isinstance(code, int) and 400 <= code < 500
+
+
+class DeliveryEngine:
+    def __init__(
+        self,
+        pool,
+        rcpt_per_message=1,
+        logger=None,
+        limiter=None,
+        max_retries=3,
+        retry_backoff=1.0,
+    ):
+        """初始化并发投递引擎，将收件人分批分配到连接池中的连接上。
+
+        参数:
+            pool (SMTPConnectionPool): SMTP连接池
+            rcpt_per_message (int): 每次投递事务包含的收件人数，大于1时使用群发To头
+            logger (logging.Logger, 可选): 日志记录器
+            limiter (AdaptiveRateLimiter, 可选): 发送速率限制器，为None时不限速
+            max_retries (int): 遇到4xx临时错误时的最大重试次数
+            retry_backoff (float): 首次重试前等待的秒数，之后按指数增长
+        """
+        self.pool = pool
+        self.rcpt_per_message = max(1, rcpt_per_message)
+        self.logger = logger
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    def _batches(self, recipients):
+        batch = []
+        for recipient in recipients:
+            batch.append(recipient)
+            if len(batch) >= self.rcpt_per_message:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _fail(self, result, recipient, error):
+        result.add_failed(recipient, str(error))
+        incr("emails_failed")
+        if self.logger:
+            self.logger.error(f"发送邮件至 {recipient} 时出错：{str(error)}")
+
+    def _attempt(self, sender, batch, render):
+        """尝试投递一次。
+
+        返回:
+            tuple: (成功的收件人列表, 收件人到错误信息的映射, 收件人到临时错误的映射)
+        """
+        # 先生成邮件再获取连接，生成出错时不会占用连接
+        try:
+            message = render(batch)
+        except Exception as e:
+            return [], {recipient: e for recipient in batch}, {}
+
+        if self.limiter:
+            self.limiter.acquire()
+        try:
+            server = self.pool.acquire()
+        except smtplib.SMTPResponseException as e:
+            if _is_temporary(e.smtp_code):
+                return [], {}, {recipient: e for recipient in batch}
+            return [], {recipient: e for recipient in batch}, {}
+        except (smtplib.SMTPException, OSError) as e:
+            return [], {recipient: e for recipient in batch}, {}
+
+        try:
+            with stage("smtp_send"):
+                refused = server.sendmail(sender, batch, message)
+        except smtplib.SMTPRecipientsRefused as e:
+            self.pool.release(server)
+            refused = e.recipients
+        except smtplib.SMTPResponseException as e:
+            # 连接状态未知，丢弃后由下一批重新建立
+            self.pool.discard(server)
+            if _is_temporary(e.smtp_code):
+                return [], {}, {recipient: e for recipient in batch}
+            return [], {recipient: e for recipient in batch}, {}
+        except Exception as e:
+            # 包括网络错误和数据编码错误，连接状态未知时一律丢弃
+            self.pool.discard(server)
+            return [], {recipient: e for recipient in batch}, {}
+        else:
+            self.pool.release(server)
+
+        delivered = [recipient for recipient in batch if recipient not in refused]
+        failed = {}
+        temporary = {}
+        for recipient, reply in refused.items():
+            if _is_temporary(reply[0]):
+                temporary[recipient] = reply
+            else:
+                failed[recipient] = reply
+        return delivered, failed, temporary
+
+    def _send_batch(self, sender, batch, render, result):
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # 指数退避并加入随机抖动，避免多个连接同时重试
+                delay = self.retry_backoff * 2 ** (attempt - 1)
+                time.sleep(delay + random.uniform(0, delay))
+            delivered, failed, temporary = self._attempt(sender, pending, render)
+
+            incr("emails_delivered", len(delivered))
+            for recipient in delivered:
+                result.add_delivered(recipient)
+                if self.logger:
+                    self.logger.info(f"邮件已成功发送至 {recipient}")
+            for recipient, error in failed.items():
+                self._fail(result, recipient, error)
+            if self.limiter:
+                if temporary:
+                    self.limiter.on_throttle()
+                elif delivered:
+                    self.limiter.on_success()
+            if not temporary:
+                return
+            pending = list(temporary)
+            incr("smtp_temporary_failures", len(pending))
+            if self.logger and attempt < self.max_retries:
+                self.logger.warning(
+                    f"服务器暂时拒绝 {len(pending)} 个收件人，"
+                    f"第 {attempt + 1} 次重试前降低发送速率"
+                )
+
+        for recipient in pending:
+            self._fail(result, recipient, temporary[recipient])
+
+    def deliver(self, sender, recipients, render, result=None):
+        """并发投递邮件，单个收件人或批次的失败不影响其他收件人。
+
+        参数:
+            sender (str): 发件人地址
+            recipients (iterable): 收件人邮箱地址
+            render (callable): 接收一批收件人并返回邮件字节的函数
+            result (DeliveryResult, 可选): 用于累计结果的对象
+
+        返回:
+            DeliveryResult: 投递结果
+        """
+        result = result or DeliveryResult()
+        with ThreadPoolExecutor(max_workers=self.pool.max_connections) as executor:
+            futures = [
+                executor.submit(self._send_batch, sender, batch, render, result)
+                for batch in self._batches(recipients)
+            ]
+            for future in futures:
+                future.result()
+        return result